@@ -5,6 +5,9 @@ let images = [];
 let activeCategory = "Tüm Görseller";
 let categories = [];
 let categoryCache = [];
+let lastRevision = 0; // Sunucudaki son görülen değişiklik numarası
+let categoryCounts = {}; // /stats: kategori başına sunucuda tutulan sayaçlar
+let statsTimer = null;
 
 // =====================
 // INIT
@@ -40,16 +43,33 @@ async function loadImages() {
       fetch("http://127.0.0.1:8000/categories")
     ]);
     images = await imgRes.json();
+    lastRevision = Number(imgRes.headers.get("X-Revision")) || 0;
     const catData = await catRes.json();
     categoryCache = Array.isArray(catData.categories) ? catData.categories : [];
     renderSidebarCategories(categoryCache);
     renderCategoryManageList(categoryCache);
     render();
+    refreshStats();
   } catch (e) {
     console.error("Dashboard veri alınamadı", e);
   }
 }
 
+// Kategori rozetleri: sayımlar tarayıcıda tüm diziyi gezmek yerine sunucudan
+function refreshStats() {
+  clearTimeout(statsTimer);
+  statsTimer = setTimeout(async () => {
+    try {
+      const res = await fetch("http://127.0.0.1:8000/stats");
+      const stats = await res.json();
+      categoryCounts = stats.categories || {};
+      renderSidebarCategories(categoryCache);
+    } catch (e) {
+      console.error("İstatistikler alınamadı", e);
+    }
+  }, 300);
+}
+
 let socket;
 
 function initSocket() {
@@ -57,11 +77,16 @@ function initSocket() {
 
   socket.onopen = () => {
     console.log("WS connected");
-    if (typeof syncMissingImages === "function") syncMissingImages();
+    // Kopukluk sırasında kaçırılan değişiklikleri delta olarak al
+    if (typeof syncChanges === "function") syncChanges();
   };
 
   socket.onmessage = (event) => {
     const data = JSON.parse(event.data);
+    if (typeof data.revision === "number") {
+      lastRevision = Math.max(lastRevision, data.revision);
+      refreshStats();
+    }
 
     if (data.type === "RELOAD_DATA") {
         console.log("📡 WebSocket: Veriler güncelleniyor...");
@@ -88,6 +113,18 @@ function initSocket() {
       case "IMAGE_REMOVED": onImageRemoved(data.payload.id); break;
       case "FAVORITE_TOGGLED": onFavoriteToggled(data.payload); break;
       case "IMAGE_TRASHED": onImageTrashed(data.payload); break;
+      case "CHANGES":
+        if (data.categories) {
+          categoryCache = data.categories;
+          renderSidebarCategories(categoryCache);
+          renderCategoryManageList(categoryCache);
+        }
+        applyChanges(data.payload);
+        break;
+      case "RESYNC": syncChanges(); break;
+      case "PING": socket.send("pong"); break;
+      case "SHIELD_PROGRESS": onShieldProgress(data.payload); break;
+      case "NEAR_DUPLICATE": onNearDuplicate(data.payload); break;
       default: console.warn("Bilinmeyen WS mesajı:", data);
     }
   };
@@ -103,6 +140,16 @@ function initSocket() {
 // =====================
 // WS HANDLERS
 // =====================
+function onShieldProgress(job) {
+  // Kayıt güncellemeleri CHANGES ile gelir; burada sadece ilerleme
+  console.log(`🛡️ Kalkan: ${job.done + job.failed}/${job.total} (${job.failed} hatalı)`);
+}
+
+function onNearDuplicate(payload) {
+  // Yeni kaydedilen görselin arşivde benzeri var (farklı çözünürlük / kırpma)
+  console.warn(`👯 ${payload.id} için ${payload.matches.length} benzer görsel bulundu`, payload.matches);
+}
+
 function onFavoriteToggled(payload) {
   const img = images.find(i => i.id === payload.id);
   if (img) {
@@ -117,7 +164,9 @@ async function loadInitialData() {
         const response = await fetch('http://127.0.0.1:8000/images');
         const data = await response.json();
         images = data; // Global images dizisini güncelle
+        lastRevision = Number(response.headers.get("X-Revision")) || 0;
         render();      // UI'ı tekrar çiz
+        refreshStats();
     } catch (error) {
         console.error("Veri yükleme hatası:", error);
     }
@@ -152,20 +201,58 @@ function onTrashEmptied() {
 // RENDER
 // =====================
 
-async function syncMissingImages() {
+async function syncChanges() {
   try {
-    const res = await fetch("http://127.0.0.1:8000/images");
-    const serverImages = await res.json();
-    const existingIds = new Set(images.map(img => img.id));
-    const missing = serverImages.filter(img => !existingIds.has(img.id));
-    if (!missing.length) return;
-    images = [...missing, ...images];
-    render();
+    const res = await fetch(`http://127.0.0.1:8000/changes?since=${lastRevision}`);
+    const data = await res.json();
+
+    // Sunucu bu kadar eski değişiklikleri tutmuyorsa baştan yükle
+    if (data.reset) {
+      await loadInitialData();
+      return;
+    }
+    applyChanges(data.changes);
+    lastRevision = Math.max(lastRevision, data.revision);
   } catch (e) {
     console.error("Sync failed", e);
   }
 }
 
+// Sunucu op'larını (add / patch / update / trash / delete) yerel state'e uygula
+function applyChanges(changes) {
+  if (!changes || !changes.length) return;
+
+  const byId = new Map(images.map(img => [img.id, img]));
+  const removed = new Set();
+
+  for (const change of changes) {
+    switch (change.op) {
+      case "add":
+        if (!byId.has(change.record.id)) {
+          const record = { ...change.record };
+          images.unshift(record);
+          byId.set(record.id, record);
+        }
+        break;
+      case "patch":
+        change.ids.forEach(id => { const img = byId.get(id); if (img) Object.assign(img, change.fields); });
+        break;
+      case "trash":
+        change.ids.forEach(id => { const img = byId.get(id); if (img) img.isDeleted = true; });
+        break;
+      case "update":
+        Object.entries(change.updates).forEach(([id, fields]) => { const img = byId.get(id); if (img) Object.assign(img, fields); });
+        break;
+      case "delete":
+        change.ids.forEach(id => removed.add(id));
+        break;
+    }
+  }
+
+  if (removed.size) images = images.filter(img => !removed.has(img.id));
+  render();
+}
+
 
 function renderSidebarCategories(categoryList) {
     const container = document.getElementById("sidebar-categories");
@@ -174,9 +261,10 @@ function renderSidebarCategories(categoryList) {
     container.innerHTML = categoryList.map(cat => {
         const name = cat.name;
         
+        const count = categoryCounts[name] ? categoryCounts[name].live : 0;
+
         if (name === "Kategorize Edilmemiş Favoriler") {
-            const hasImages = images.some(img => img.category === name && !img.isDeleted);
-            if (!hasImages) return ""; 
+            if (!count) return "";
         }
 
         // Aktiflik kontrolü
@@ -185,6 +273,7 @@ function renderSidebarCategories(categoryList) {
         return `
             <div class="nav-item ${isActive}" onclick="changeCategory('${name}')">
                 <span class="cat-name">${name}</span>
+                ${count ? `<span class="cat-count">${count}</span>` : ""}
             </div>
         `;
     }).join("");
@@ -392,7 +481,7 @@ function shouldRender(img) {
 // CARD (SADE)
 // =====================
 function renderCard(img) {
-  const { src} = resolveSource(img);
+  const { src} = resolveThumbSource(img);
 
   let actionButtons = '';
 
@@ -545,6 +634,15 @@ function resolveSource(img) {
 }
 
 
+// Kartlarda tam boy yerine sunucuda üretilen küçük resim (WebP)
+function resolveThumbSource(img) {
+  if (!img.thumbFailed && ((img.isSafe && img.SafePath) || img.isCORS)) {
+    return { src: `http://127.0.0.1:8000/thumb/${img.id}?w=512` };
+  }
+  return resolveSource(img);
+}
+
+
 // =====================
 // UI
 // =====================
@@ -580,6 +678,13 @@ async function handleImageError(imgEl, imageId, originalUrl) {
   const img = images.find(i => i.id === imageId);
   if (!img) return;
 
+  // Küçük resim üretilemediyse normal kaynağa dön
+  if (imgEl.src.includes("/thumb/") && !img.thumbFailed) {
+    img.thumbFailed = true;
+    render();
+    return;
+  }
+
   // 🔒 sadece 1 kere
   if (img.proxyTried) return;
   img.proxyTried = true;
@@ -1,47 +1,91 @@
 import os
 import json
 import uuid
+import hashlib
+import tarfile
+import zipfile
 import urllib.parse
-from typing import Optional, List
+from typing import Optional, List, Dict
 from contextlib import asynccontextmanager
 
 import asyncio
 import time
-import shutil
 import pathlib
 
-import requests
-from httpx import AsyncClient
-
-from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi import FastAPI, HTTPException, WebSocket, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, FileResponse
-from pydantic import BaseModel
+from fastapi.responses import Response, FileResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+
+from storage import ImageRepository, ImageStore, OperationJournal, import_legacy_json
+from health import HealthChecker, RevalidationScheduler
+from proxy import ImageProxy, ProxyCache, UpstreamError
+from thumbs import ThumbnailService, pick_size
+from watcher import DownloadWatcher
+from shield import ShieldService, SafeStorage
+from similar import SimilarityIndex
+from canonical import canonical_key
+from search import SearchIndex
+from stats import ArchiveStats
+from archive import ArchiveImporter, MEDIA_TYPES, iter_ndjson, iter_bundle
+from metrics import REGISTRY, TimedLock, span, upstream_hooks
+from iopool import IOExecutor, LoopWatchdog
+from serialize import FastJSONResponse, EncodedCache, dumps_str
 
 
 
 
 
 
-db_lock = asyncio.Lock()
+# Bekleme / tutma süreleri /metrics'te (lock_wait_seconds{lock="db"})
+db_lock = TimedLock("db")
 
 # =====================
 # APP SETUP
 # =====================
-app = FastAPI()
+# Yanıtlar orjson ile (yoksa stdlib json, kompakt)
+app = FastAPI(default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Revision"],
 )
 
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "Tamamlanan HTTP istekleri")
+HTTP_SECONDS = REGISTRY.histogram("http_request_seconds", "Yanıt başlıklarına kadar geçen süre (saniye)")
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Etiket olarak URL değil rota şablonu: /thumb/{img_id}
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path)
+        HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+
+
 DB_FILE = os.path.join("Dashboard", "database", "images.json")
+DB_PATH = os.path.join("Dashboard", "database", "images.db")
+JOURNAL_PATH = os.path.join("Dashboard", "database", "images.journal")
 CAT_LIST = os.path.join("..", "Addon", "categories.json")
 DOWNLOADS_PATH = str(os.path.join(pathlib.Path.home(), "Downloads"))
 SAFE_STORAGE = os.path.join(os.getenv('APPDATA'), 'MorgiFile', 'Safe')
 os.makedirs(SAFE_STORAGE, exist_ok=True)
+PROXY_CACHE = os.path.join(os.getenv('APPDATA'), 'MorgiFile', 'Cache')
+PROXY_BASE = "http://127.0.0.1:8000/proxy/image"
+THUMB_STORAGE = os.path.join(os.getenv('APPDATA'), 'MorgiFile', 'Thumbs')
+# > 0 ise bu kadar saniyede bir metrik özeti tek satır JSON olarak loglanır
+METRICS_LOG_INTERVAL = float(os.getenv("MORGIFILE_METRICS_LOG", "0"))
 
 # =====================
 # SCHEMAS
@@ -56,6 +100,11 @@ class ImageSaveSchema(BaseModel):
     
 
 
+class ImageBatchSchema(BaseModel):
+    # Öğeler tek tek doğrulanır: hatalı bir öğe tüm isteği düşürmesin
+    items: List[dict]
+
+
 class CategoryCreateSchema(BaseModel):
     name: str
 
@@ -64,220 +113,430 @@ class CategoryRenameSchema(BaseModel):
     newName: str
     merge: bool = False
 
+class ShieldBatchSchema(BaseModel):
+    # ids verilmezse filtreye uyan tüm (çöpte olmayan) görseller
+    ids: Optional[List[str]] = None
+    category: Optional[str] = None
+    isFavorite: Optional[bool] = None
+    site: Optional[str] = None
+
+class BulkImageSchema(BaseModel):
+    ids: List[str]
+    action: str                    # recategorize | trash | restore
+    category: Optional[str] = None
+
 class CategoryDeleteSchema(BaseModel):
     name: str
     action: Optional[str] = None   # delete_images | move_images
     moveTo: Optional[str] = None
 
 
+class ClientConnection:
+    def __init__(self, websocket: WebSocket, max_queue: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.last_seen = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+
+RESYNC_MESSAGE = dumps_str({"type": "RESYNC"})
+PING_MESSAGE = dumps_str({"type": "PING"})
+
+
+# Her bağlantının kendi gönderim kuyruğu ve yazıcı task'ı var; broadcast
+# sadece kuyruklara bırakır, yavaş bir sekme yazma işlemlerini bekletmez.
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, max_queue: int = 256, send_timeout: float = 10,
+                 heartbeat_interval: float = 20, heartbeat_timeout: float = 60):
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, self.max_queue)
+        client.task = asyncio.create_task(self._writer(client))
+        self.active_connections[websocket] = client
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        client = self.active_connections.pop(websocket, None)
+        if client and client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
 
-    async def broadcast(self, message: dict):
-        dead_connections = []
+    def touch(self, websocket: WebSocket):
+        client = self.active_connections.get(websocket)
+        if client:
+            client.last_seen = time.monotonic()
 
-        for connection in self.active_connections:
+    async def broadcast(self, message: dict):
+        with span("broadcast"):
+            # Mesaj bağlantı başına değil, bir kez kodlanır
+            text = dumps_str(message)
+            for client in list(self.active_connections.values()):
+                self._enqueue(client, text)
+        WS_MESSAGES.inc(type=message.get("type"))
+
+    def _enqueue(self, client: ClientConnection, message: str):
+        try:
+            client.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Geride kalan istemci: biriken mesajları at, tek bir RESYNC bırak;
+            # istemci /changes ile kaldığı revision'dan devam eder
+            while not client.queue.empty():
+                client.queue.get_nowait()
+            client.queue.put_nowait(RESYNC_MESSAGE)
+            WS_OVERFLOWS.inc()
+
+    async def _writer(self, client: ClientConnection):
+        try:
+            while True:
+                message = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(message), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Ölmüş / takılmış socket'i temizle ve kapat
+            self.disconnect(client.websocket)
             try:
-                await connection.send_json(message)
+                await asyncio.wait_for(client.websocket.close(), 1)
             except Exception:
-                dead_connections.append(connection)
+                pass
 
-        # Ölmüş socket'leri temizle
-        for dc in dead_connections:
-            self.disconnect(dc)
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for websocket, client in list(self.active_connections.items()):
+                if now - client.last_seen > self.heartbeat_timeout:
+                    print("🔌 Yanıt vermeyen WebSocket bağlantısı kapatıldı")
+                    self.disconnect(websocket)
+                    try:
+                        await asyncio.wait_for(websocket.close(), 1)
+                    except Exception:
+                        pass
+                else:
+                    self._enqueue(client, PING_MESSAGE)
 
 
 manager = ConnectionManager()
 
+WS_MESSAGES = REGISTRY.counter("ws_broadcasts_total", "WebSocket yayınları (mesaj tipine göre)")
+WS_OVERFLOWS = REGISTRY.counter("ws_queue_overflows_total", "Kuyruğu taşan, RESYNC'e düşürülen istemciler")
+REGISTRY.gauge("ws_connections", "Açık WebSocket bağlantıları",
+               fn=lambda: {(): len(manager.active_connections)})
+REGISTRY.gauge("ws_queued_messages", "Gönderilmeyi bekleyen WebSocket mesajları",
+               fn=lambda: {(): sum(c.queue.qsize() for c in manager.active_connections.values())})
+
 # =====================
 # DB HELPERS
 # =====================
-def init_db():
-    os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
-    if not os.path.exists(DB_FILE):
-        write_db([])
-
-
-def read_db() -> List[dict]:
-    try:
-        with open(DB_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
+# SQLite ve dosya işlemleri event loop'u bloklamasın: sınırlı thread havuzu
+io_executor = IOExecutor(max_workers=8)
+# 100 ms'yi aşan loop duraksamaları loglanır ve /metrics'te sayılır
+loop_watchdog = LoopWatchdog(budget=0.1)
+
+repo = ImageRepository(DB_PATH)
+# Journal her değişikliği anında kalıcı kılar; snapshot (SQLite) boşta kalınca
+# ya da journal 4 MB'ı aşınca toplu güncellenir
+store = ImageStore(
+    repo, io_executor, OperationJournal(JOURNAL_PATH), flush_delay=30,
+    background_fields=("lastCheckedAt", "healthStatus", "phash"),
+)
+# Store'daki her değişiklikte artımlı güncellenir (load sırasında da dolar)
+search_index = SearchIndex(store)
+archive_stats = ArchiveStats()
+store.listeners.extend((search_index, archive_stats))
 
 
-def write_db(data: List[dict]):
-    with open(DB_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+def init_db():
+    # İlk açılışta eski JSON arşivini SQLite'a aktar
+    import_legacy_json(repo, DB_FILE, CAT_LIST)
+    with span("store_load"):
+        store.load()
+
+    # Kanonik anahtarı olmayan (eski) kayıtlar için tek seferde hesapla
+    missing = {
+        img["id"]: {"canonicalKey": canonical_key(img["originalUrl"], img.get("site"))}
+        for img in store.all() if not img.get("canonicalKey")
+    }
+    if missing:
+        store.update_many(missing)
+        print(f"🔑 {len(missing)} görsel için kanonik URL anahtarı üretildi")
+
+    # Kalkan dosyası boyutu istatistikler için kayıtta tutulur
+    sizes = {}
+    for img in store.all():
+        if img.get("isSafe") and img.get("SafePath") and "safeSize" not in img:
+            try:
+                sizes[img["id"]] = {"safeSize": os.path.getsize(os.path.normpath(img["SafePath"]))}
+            except OSError:
+                pass
+    if sizes:
+        store.update_many(sizes)
 
 def init_categories():
-    os.makedirs(os.path.dirname(CAT_LIST), exist_ok=True)
-    if not os.path.exists(CAT_LIST):
-        write_categories({
+    if not store.list_categories():
+        store_categories({
             "categories": [
                 { "name": "Kategorize Edilmemiş Favoriler" }
             ]
         })
 
 
-def read_categories() -> dict:
+async def read_categories() -> dict:
+    return {"categories": await io_executor.run(store.list_categories)}
+
+async def write_categories(data: dict):
+    await io_executor.run(store_categories, data)
+
+def store_categories(data: dict):
+    store.replace_categories(data.get("categories", []))
+
+    # Eklenti categories.json'u kendi paketinden okuduğu için dosyayı da güncel tut
     try:
-        if not os.path.exists(CAT_LIST):
-            return {"categories": []}
-        with open(CAT_LIST, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {"categories": []}
+        os.makedirs(os.path.dirname(CAT_LIST), exist_ok=True)
+        with open(CAT_LIST, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+    except OSError as e:
+        print(f"⚠️ categories.json yazılamadı: {e}")
 
-def write_categories(data: dict):
-    with open(CAT_LIST, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
 
+# =====================
+# HEALTH CHECK
+# =====================
+async def notify_dead(img: dict):
+    await manager.broadcast({
+        "type": "IMAGE_UPDATED",
+        "revision": store.revision,
+        "payload": { "id": img["id"], "isDead": True }
+    })
+
+
+async def broadcast_changes(since: int, categories: Optional[List[dict]] = None):
+    # Toplu işlemlerde tek mesajda, revision'dan beri olan op'ları gönder;
+    # kategori listesi de değiştiyse aynı mesaja eklenir
+    changes = store.changes_since(since)
+    if changes is None:
+        # Değişiklik günlüğünü aşan işlem: istemciler baştan senkronize olsun
+        await manager.broadcast({"type": "RESYNC"})
+        changes = []
+    if not changes and categories is None:
+        return
+    message = {
+        "type": "CHANGES",
+        "revision": store.revision,
+        "payload": changes
+    }
+    if categories is not None:
+        message["categories"] = categories
+    await manager.broadcast(message)
+
+
+async def notify_near_duplicate(img: dict, matches: List[dict]):
+    # Yeni kaydedilen görselin benzerleri arşivde zaten var
+    print(f"👯 Olası kopya: {img['id']} -> {[m['id'] for m in matches]}")
+    await manager.broadcast({
+        "type": "NEAR_DUPLICATE",
+        "payload": { "id": img["id"], "matches": matches }
+    })
+
+
+async def notify_shield_progress(job: dict):
+    await manager.broadcast({"type": "SHIELD_PROGRESS", "payload": job})
 
-def check_images_health():
-    data = read_db()  # Mevcut JSON listeni yükleyen fonksiyonun
-    updated = False
-    
-    print("🔍 Görsel sağlık kontrolü başlatılıyor...")
-    
-    for img in data:
-        # Zaten ölü olarak işaretlenmişse veya yerel dosyaysa atla
-        if img.get("isDead") or img["originalUrl"].startswith("images/"):
-            continue
-            
-        try:
-            # Sadece başlıkları kontrol et (resmi indirmez, çok hızlıdır)
-            # allow_redirects=True önemli, çünkü Instagram yönlendirme yapabilir
-            response = requests.head(img["originalUrl"], timeout=5, allow_redirects=True)
-            
-            # Eğer status 400 ve üzerindeyse (404, 410 vb.) bu link ölmüştür
-            if response.status_code >= 400:
-                print(f"💀 Ölü görsel tespit edildi (Status {response.status_code}): {img['id']}")
-                img["isDead"] = True
-                updated = True
-        except Exception as e:
-            # Zaman aşımı veya erişim hatası durumunda da ölü sayabiliriz
-            # Ama internetin kesik olma ihtimaline karşı dikkatli olmalı
-            print(f"⚠️ Bağlantı hatası ({img['id']}): {e}")
-            # Opsiyonel: img["isDead"] = True (Burayı şimdilik kapalı tutabilirsin)
 
-    if updated:
-        write_db(data)
-        print("✅ JSON güncellendi.")
-    else:
-        print("✨ Tüm görseller sağlıklı veya zaten işaretlenmiş.")
+health_checker = HealthChecker(store, on_dead=notify_dead, event_hooks=upstream_hooks("health"))
+scheduler = RevalidationScheduler(store, health_checker)
+proxy_cache = ProxyCache(PROXY_CACHE, executor=io_executor)
+image_proxy = ImageProxy(proxy_cache, event_hooks=upstream_hooks("proxy"))
+thumbnails = ThumbnailService(THUMB_STORAGE)
+REGISTRY.gauge("proxy_cache_events", "Proxy önbelleği olayları (hit, miss, stale...)",
+               fn=lambda: {(("result", k),): v for k, v in proxy_cache.stats.items()})
+REGISTRY.gauge("images", "Arşivdeki görseller", fn=lambda: {(): store.count()})
+REGISTRY.gauge("store_revision", "Store revision", fn=lambda: {(): store.revision})
+# Kaynak dosya küçük resimlerle aynı yerden gelir (kalkan dosyası / proxy önbelleği)
+similar_index = SimilarityIndex(
+    store, lambda img, fetch: thumbnail_source(img, fetch), on_duplicate=notify_near_duplicate
+)
+REGISTRY.gauge("similar_index", "Benzerlik indeksi (indexed, queued, failed, available)",
+               fn=lambda: {(("state", k),): int(v) for k, v in similar_index.stats().items()})
+download_watcher = DownloadWatcher(DOWNLOADS_PATH, executor=io_executor)
+safe_storage = SafeStorage(SAFE_STORAGE, store, executor=io_executor)
+# Proxy ile aynı bağlantı havuzu kullanılır
+shield_service = ShieldService(
+    store, safe_storage, lambda: image_proxy.client, cache=proxy_cache,
+    on_progress=notify_shield_progress, on_commit=broadcast_changes,
+)
+
+
+async def on_import_batch(since: int, records: List[dict]):
+    for entry in records:
+        scheduler.schedule(entry)
+        similar_index.enqueue(entry)
+    await broadcast_changes(since)
 
 
-init_db()
-init_categories()
+archive_importer = ArchiveImporter(store, safe_storage, io_executor, on_commit=on_import_batch, lock=db_lock)
+background_tasks = set()
 
 # =====================
 # ENDPOINTS
 # =====================
+
+async def log_metrics(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        print("📈 " + json.dumps(REGISTRY.snapshot(), ensure_ascii=False))
+
+
 @app.on_event("startup")
 async def startup_event():
-    # Uygulama açıldığında bir kez kontrol et
-    check_images_health()
+    # Ağır başlangıç işleri import yerine burada: thumbnail worker process'leri
+    # app modülünü tekrar import ettiğinde veritabanını yüklemesin
+    init_db()
+    init_categories()
+    await io_executor.run(proxy_cache.load)
+    await download_watcher.start()
+
+    # Hiç kontrol edilmemişler önce, sonra en eski kontrol edilenler
+    # (arka planda, açılışı bekletmez)
+    for coro in (
+        scheduler.run(), manager.heartbeat(), loop_watchdog.run(),
+        safe_storage.migrate(broadcast_changes), similar_index.run(),
+        *([log_metrics(METRICS_LOG_INTERVAL)] if METRICS_LOG_INTERVAL > 0 else []),
+    ):
+        task = asyncio.create_task(coro)
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in list(background_tasks):
+        task.cancel()
+    await shield_service.close()
+    await image_proxy.close()
+    thumbnails.close()
+    similar_index.close()
+    download_watcher.stop()
+    # Bekleyen write-behind değişikliklerini diske yaz
+    await store.close()
+    io_executor.close()
 
 
 @app.post("/images/{img_id}/verify-and-shield")
 async def verify_shield(img_id: str):
-    # 1. Downloads tara
-    try:
-        files = [os.path.join(DOWNLOADS_PATH, f) for f in os.listdir(DOWNLOADS_PATH)]
-    except Exception:
+    img = store.get_by_id(img_id)
+    if not img:
+        raise HTTPException(status_code=404, detail="Görsel veritabanında bulunamadı.")
+
+    if not download_watcher.available:
         raise HTTPException(status_code=500, detail="İndirme klasörüne erişilemedi.")
 
-    if not files:
-        raise HTTPException(status_code=404, detail="İndirme klasörü boş görünüyor.")
-
-    # 2. En yeniye göre diz
-    files.sort(key=os.path.getmtime, reverse=True)
-
-    # 3. Son 60 saniye içindeki görseli bul
-    target_file = None
-    now = time.time()
-    for f in files:
-        if os.path.isfile(f) and (now - os.path.getmtime(f) < 60):
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                target_file = f
-                break
-
-    if target_file:
-        ext = os.path.splitext(target_file)[1]
-        new_name = f"{img_id}{ext}"
-        final_path = os.path.join(SAFE_STORAGE, new_name)
-        
-        # Dosyayı taşı
-        shutil.move(target_file, final_path)
-        
-        # 🔥 İŞTE EKSİK OLAN KISIM: DB GÜNCELLEME
-        all_images = read_db() # JSON dosyanı oku
-        updated = False
-        
-        for img in all_images:
-            if img["id"] == img_id:
-                img["isSafe"] = True
-                img["SafePath"] = final_path
-                updated = True
-                break
-        # ... (dosya taşıma ve JSON yazma işlemleri bittikten sonra)
-        if updated:
-            write_db(all_images)
-            
-            # 📡 WEB SOCKET YAYINI: Tüm istemcilere "veriler değişti, yenilenin" de
-            if manager: # Senin WebSocket manager nesnenin adı neyse (genelde manager olur)
-                await manager.broadcast({"type": "RELOAD_DATA", "message": "Görsel kalkan altına alındı!"})
-                
-            return {"status": "success", "safe_path": final_path}
-        else:
-            raise HTTPException(status_code=404, detail="Görsel veritabanında bulunamadı.")
-    
-    raise HTTPException(status_code=404, detail="Yeni bir görsel dosyası bulunamadı.")
-    
+    # 1. İzleyicinin tuttuğu son indirmelerden eşleşeni seç
+    #    (URL'deki dosya adı > proxy önbelleğindeki boyut > son 60 sn'deki en yeni)
+    cached = proxy_cache.lookup(img["originalUrl"])
+    target = await download_watcher.wait_for(
+        img["originalUrl"], size=cached["size"] if cached else None, max_age=60
+    )
+    if not target:
+        raise HTTPException(status_code=404, detail="Yeni bir görsel dosyası bulunamadı.")
+
+    # Dosyayı içerik özetiyle depoya taşı (aynı içerik varsa paylaşılır)
+    download_watcher.forget(target.path)
+    digest, final_path = await safe_storage.adopt(target.path)
+
+    # update_fields kaydı yerinde değiştirir: eski dosya bilgisini önce kopyala
+    size = await io_executor.run(os.path.getsize, final_path)
+    current = store.get_by_id(img_id) or {}
+    previous = {"isSafe": True, "SafePath": current.get("SafePath"), "safeHash": current.get("safeHash")}
+
+    # 🔥 DB GÜNCELLEME (tek kayıt, nokta yazımı)
+    updated = store.update_fields(img_id, {
+        "isSafe": True, "SafePath": final_path, "safeHash": digest, "safeSize": size,
+    })
+    if not updated:
+        await safe_storage.discard(digest, final_path)
+        raise HTTPException(status_code=404, detail="Görsel veritabanında bulunamadı.")
+    safe_storage.unpin(digest)
+
+    # Eski dosya başka görselle paylaşılmıyorsa kaldır
+    if previous["SafePath"] and previous["SafePath"] != final_path:
+        await safe_storage.release([previous])
+
+    # 📡 WEB SOCKET YAYINI: tam yenileme yerine sadece değişen alanlar
+    await manager.broadcast({
+        "type": "IMAGE_UPDATED",
+        "revision": store.revision,
+        "payload": { "id": img_id, "isSafe": True, "SafePath": final_path }
+    })
+
+    return {"status": "success", "safe_path": final_path}
+
+@app.post("/images/shield")
+async def shield_images(data: ShieldBatchSchema):
+    filters = {
+        key: value for key, value in (
+            ("category", data.category), ("isFavorite", data.isFavorite), ("site", data.site),
+        ) if value is not None
+    }
+    targets = shield_service.targets(data.ids, filters)
+    if not targets:
+        return {"status": "empty", "total": 0}
+
+    # İndirmeler arka planda sürer; ilerleme /ws üzerinden SHIELD_PROGRESS ile gelir
+    job = shield_service.start(targets)
+    return FastJSONResponse(job.to_dict(), status_code=202)
+
+@app.get("/images/shield/{job_id}")
+async def get_shield_job(job_id: str):
+    job = shield_service.jobs.get(job_id)
+    if not job:
+        raise HTTPException(404, "Kalkan işi bulunamadı")
+    return job.to_dict()
+
+def new_image_entry(data: ImageSaveSchema, key: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "site": data.site,
+        "originalUrl": data.originalUrl,
+        "canonicalKey": key,
+        "ProxyUrl": str(),
+        "SafePath":str(),
+        "category": data.category,
+        "width": data.width,
+        "height": data.height,
+        "isFavorite": False,
+        "isDeleted": False,
+        "isDead": False,
+        "isCORS":False,
+        "isSafe": False
+    }
+
 @app.post("/add-image")
 async def add_image(data: ImageSaveSchema):
     async with db_lock:
         try:
-            db = read_db()
-
-            # DUPLICATE CHECK
-            if any(img.get("originalUrl") == data.originalUrl for img in db):
+            # DUPLICATE CHECK: birebir URL veya site bazlı kanonik anahtar (O(1))
+            key = canonical_key(data.originalUrl, data.site)
+            if store.find_by_url(data.originalUrl) or store.find_by_key(key):
                 return {
                     "status": "already_exists",
                     "message": "Bu görsel zaten kayıtlı."
                 }
 
-            new_entry = {
-                "id": str(uuid.uuid4()),
-                "site": data.site,
-                "originalUrl": data.originalUrl,
-                "ProxyUrl": str(),
-                "SafePath":str(),
-                "category": data.category,
-                "width": data.width,
-                "height": data.height,
-                "isFavorite": False,
-                "isDeleted": False,
-                "isDead": False,
-                "isCORS":False,
-                "isSafe": False
-            }
+            new_entry = new_image_entry(data, key)
+
+            store.insert(new_entry)
 
-            db.append(new_entry)
-            write_db(db)
+            scheduler.schedule(new_entry)
+            similar_index.enqueue(new_entry, notify=True)
 
             await manager.broadcast({
                 "type": "NEW_IMAGE",
+                "revision": store.revision,
                 "payload": new_entry
             })
 
@@ -293,19 +552,196 @@ async def add_image(data: ImageSaveSchema):
             )
 
 
+@app.post("/images/batch")
+async def add_images_batch(data: ImageBatchSchema):
+    if len(data.items) > 1000:
+        raise HTTPException(413, "Tek istekte en fazla 1000 görsel gönderilebilir")
+
+    results = []
+    new_entries = []
+
+    async with db_lock:
+        # 1. Doğrula ve tekilleştir (arşive ve aynı istekteki diğer öğelere karşı)
+        seen = set()
+        for item in data.items:
+            try:
+                image = ImageSaveSchema(**item)
+            except (ValidationError, TypeError) as e:
+                results.append({"status": "invalid", "error": str(e)})
+                continue
+
+            key = canonical_key(image.originalUrl, image.site)
+            existing = store.find_by_url(image.originalUrl) or store.find_by_key(key)
+            if existing:
+                results.append({"status": "already_exists", "id": existing["id"]})
+                continue
+            if key in seen or image.originalUrl in seen:
+                results.append({"status": "duplicate_in_batch"})
+                continue
+            seen.update((key, image.originalUrl))
+
+            entry = new_image_entry(image, key)
+            new_entries.append(entry)
+            results.append({"status": "success", "id": entry["id"]})
+
+        # 2. Tek journal yazımı
+        since = store.revision
+        store.insert_many(new_entries)
+
+    for entry in new_entries:
+        scheduler.schedule(entry)
+        similar_index.enqueue(entry, notify=True)
+
+    # 3. Tek yayın: tüm eklemeler tek CHANGES mesajında
+    await broadcast_changes(since)
+
+    return {
+        "added": len(new_entries),
+        "items": results
+    }
+
+
+# Tam koleksiyonun kodlanmış gövdesi; görünür her değişiklik visible_revision'ı
+# artırdığı için bir sonraki istekte yeniden üretilir. Sağlık kontrolü / phash
+# yazımları önbelleği düşürmez (bu alanlar bir sonraki görünür değişiklikte gelir)
+images_body = EncodedCache(store.all, lambda: store.visible_revision)
+REGISTRY.gauge("images_body_cache", "/images gövde önbelleği (hit / miss)",
+               fn=lambda: {(("result", "hit"),): images_body.hits, (("result", "miss"),): images_body.misses})
+
+# Süreç her açıldığında revision sıfırdan başladığı için ETag'e karıştırılır
+ETAG_EPOCH = uuid.uuid4().hex[:8]
+
+
+def images_etag(request: Request) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{ETAG_EPOCH}:{store.visible_revision}:{query}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
 @app.get("/images")
-async def get_images():
+async def get_images(
+    request: Request,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+    category: Optional[str] = None,
+    isFavorite: Optional[bool] = None,
+    isDeleted: Optional[bool] = None,
+    isDead: Optional[bool] = None,
+    isSafe: Optional[bool] = None,
+    site: Optional[str] = None,
+):
+    # Koleksiyon değişmediyse hiç serialize etmeden 304 dön
+    etag = images_etag(request)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Revision": str(store.revision)}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
     try:
-        # check_images_health()  <-- BURAYI YORUMA AL VEYA SİL
-        with open(DB_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data
+        filters = {
+            key: value for key, value in (
+                ("category", category), ("isFavorite", isFavorite), ("isDeleted", isDeleted),
+                ("isDead", isDead), ("isSafe", isSafe), ("site", site),
+            ) if value is not None
+        }
+
+        # Parametresiz istek: eski davranış, tüm liste (dashboard)
+        if limit is None and cursor is None and not filters and not fields:
+            # Aynı revision'da tekrar kodlanmaz: önbellekteki bytes doğrudan gönderilir
+            with span("images_encode"):
+                body = images_body.get()
+            return Response(body, media_type="application/json", headers=headers)
+
+        items, next_cursor = store.list_page(cursor, max(1, min(limit or 100, 1000)), filters)
+
+        if fields:
+            keys = list(dict.fromkeys(["id", *(f.strip() for f in fields.split(",") if f.strip())]))
+            items = [{k: img[k] for k in keys if k in img} for img in items]
+
+        return FastJSONResponse({"items": items, "nextCursor": next_cursor}, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Veriler okunamadı")
 
+@app.get("/stats")
+async def get_stats():
+    return archive_stats.summary()
+
+@app.get("/search")
+async def search_images(
+    q: str = "",
+    cursor: Optional[int] = None,
+    limit: int = 50,
+    facets: Optional[str] = None,
+):
+    # q: serbest metin (önek eşleşmesi) + "category:X", "site:X", "is:favorite|dead|safe|cors|deleted"
+    return search_index.search(
+        q,
+        cursor=cursor,
+        limit=max(1, min(limit, 500)),
+        facets=[f.strip() for f in (facets or "").split(",") if f.strip()],
+    )
+
+@app.get("/changes")
+async def get_changes(since: int = 0):
+    changes = store.changes_since(since)
+    if changes is None:
+        # Çok eski revision: istemci /images ile baştan yüklemeli
+        return {"revision": store.revision, "reset": True, "changes": []}
+    return {"revision": store.revision, "reset": False, "changes": changes}
+
+@app.get("/export")
+async def export_archive(format: str = "ndjson"):
+    # ndjson: yalnızca kayıtlar; tar / zip: kayıtlar + Safe dosyaları
+    if format not in MEDIA_TYPES:
+        raise HTTPException(400, "Geçersiz format (ndjson, tar, zip)")
+    categories = (await read_categories()).get("categories", [])
+    body = iter_ndjson(store, categories) if format == "ndjson" else iter_bundle(store, categories, format, io_executor)
+    filename = f"morgifile-{time.strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Revision": str(store.revision),
+    })
+
+@app.post("/import")
+async def import_archive(request: Request, format: str = "auto"):
+    # Gövde parça parça okunur; originalUrl / kanonik anahtarla zaten var olan
+    # kayıtlar atlanır, yarıda kalan içe aktarma tekrar gönderilerek tamamlanır
+    if format != "auto" and format not in MEDIA_TYPES:
+        raise HTTPException(400, "Geçersiz format (auto, ndjson, tar, zip)")
+    try:
+        result = await archive_importer.run(request.stream(), format)
+    except (tarfile.TarError, zipfile.BadZipFile) as e:
+        raise HTTPException(400, f"Arşiv okunamadı: {e}")
+
+    # Arşivdeki eksik kategoriler eklenir
+    async with db_lock:
+        categories = (await read_categories()).get("categories", [])
+        names = {c["name"] for c in categories}
+        missing = []
+        for c in result.pop("categories"):
+            if isinstance(c, dict) and isinstance(c.get("name"), str) and c["name"] not in names:
+                names.add(c["name"])
+                missing.append({"name": c["name"]})
+        if missing:
+            categories = categories + missing
+            await write_categories({"categories": categories})
+    if missing:
+        await broadcast_changes(store.revision, categories=categories)
+
+    print(f"📥 İçe aktarma: {result}")
+    return result
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/health/scheduler")
+async def get_scheduler_stats():
+    return scheduler.stats()
+
 @app.get("/categories")
 async def get_categories():
-    cats = read_categories()
+    cats = await read_categories()
     return {
         "categories": cats.get("categories", [])
     }
@@ -313,90 +749,79 @@ async def get_categories():
 
 @app.post("/categories")
 async def add_category(data: CategoryCreateSchema):
-    cats = read_categories()
-    categories = cats.get("categories", [])
-
     name = data.name.strip()
 
     if not name:
         raise HTTPException(400, "Kategori adı boş")
 
-    if any(c["name"].lower() == name.lower() for c in categories):
-        raise HTTPException(409, "Kategori zaten var")
+    # Okuma ile yazma arasında silme / yeniden adlandırma araya girmesin
+    async with db_lock:
+        categories = (await read_categories()).get("categories", [])
+
+        if any(c["name"].lower() == name.lower() for c in categories):
+            raise HTTPException(409, "Kategori zaten var")
 
-    new_cat = { "name": name }
-    categories.append(new_cat)
+        new_cat = { "name": name }
+        categories.append(new_cat)
 
-    write_categories({ "categories": categories })
+        await write_categories({ "categories": categories })
 
     return new_cat
 
 
 @app.delete("/categories")
 async def delete_category(data: CategoryDeleteSchema):
-    cats = read_categories()
-    categories = cats.get("categories", [])
     name = data.name
 
-    if not any(c["name"] == name for c in categories):
-        raise HTTPException(404, "Kategori yok")
-
-    images = read_db()
-
-    # 👉 Silinmemiş ve bu kategoriye ait görseller
-    related = [
-        img for img in images
-        if img.get("category") == name and not img.get("isDeleted")
-    ]
-
-    # 🔍 SADECE KONTROL (ilk istek)
-    if related and not data.action:
-        return {
-            "status": "has_images",
-            "count": len(related)
-        }
+    async with db_lock:
+        categories = (await read_categories()).get("categories", [])
 
-    # ⭐ FAVORİ / NORMAL AYRIMI
-    favorite_images = [img for img in related if img.get("isFavorite")]
-    normal_images = [img for img in related if not img.get("isFavorite")]
+        if not any(c["name"] == name for c in categories):
+            raise HTTPException(404, "Kategori yok")
 
-    # ⭐ FAVORİLER ASLA SİLİNMEZ
-    if favorite_images:
-        # Eğer bu kategori henüz yoksa listeye ekle
-        if not any(c["name"] == "Kategorize Edilmemiş Favoriler" for c in categories):
-            categories.append({"name": "Kategorize Edilmemiş Favoriler"})
+        # 🔍 SADECE KONTROL (ilk istek): sayaçtan, görselleri taramadan
+        count = archive_stats.category_count(name)
+        if count and not data.action:
+            return {
+                "status": "has_images",
+                "count": count
+            }
 
-        for img in favorite_images:
-            img["category"] = "Kategorize Edilmemiş Favoriler"
+        if data.action == "move_images" and not data.moveTo:
+            raise HTTPException(400, "moveTo gerekli")
 
-    # 🔥 NORMAL GÖRSELLERİ SİL
-    if data.action == "delete_images":
-        for img in normal_images:
-            img["isDeleted"] = True
+        # ⭐ FAVORİ / NORMAL AYRIMI (silinmemiş görseller, tek geçiş)
+        favorite_ids, normal_ids = [], []
+        for img in store.list_by_category(name):
+            (favorite_ids if img.get("isFavorite") else normal_ids).append(img["id"])
 
-    # 🔁 NORMAL GÖRSELLERİ TAŞI
-    elif data.action == "move_images":
-        if not data.moveTo:
-            raise HTTPException(400, "moveTo gerekli")
+        since = store.revision
+        with store.transaction():
+            # ⭐ FAVORİLER ASLA SİLİNMEZ
+            if favorite_ids:
+                # Eğer bu kategori henüz yoksa listeye ekle
+                if not any(c["name"] == "Kategorize Edilmemiş Favoriler" for c in categories):
+                    categories.append({"name": "Kategorize Edilmemiş Favoriler"})
+                store.bulk_update(favorite_ids, {"category": "Kategorize Edilmemiş Favoriler"})
 
-        for img in normal_images:
-            img["category"] = data.moveTo
+            # 🔥 NORMAL GÖRSELLERİ SİL
+            if data.action == "delete_images":
+                store.bulk_update(normal_ids, {"isDeleted": True})
 
-    # ❌ KATEGORİYİ SİL
-    categories = [c for c in categories if c["name"] != name]
+            # 🔁 NORMAL GÖRSELLERİ TAŞI
+            elif data.action == "move_images":
+                store.bulk_update(normal_ids, {"category": data.moveTo})
 
-    write_db(images)
-    write_categories({ "categories": categories })
+        # ❌ KATEGORİYİ SİL
+        categories = [c for c in categories if c["name"] != name]
+        await write_categories({ "categories": categories })
 
-    await manager.broadcast({
-        "type": "CATEGORIES_UPDATED",
-        "payload": read_categories().get("categories", [])
-    })
+    await broadcast_changes(since, categories=categories)
 
     return {
         "status": "deleted",
-        "affected": len(related),
-        "favorites_protected": len(favorite_images)
+        "affected": len(favorite_ids) + len(normal_ids),
+        "favorites_protected": len(favorite_ids)
     }
 
 
@@ -408,77 +833,112 @@ async def rename_category(data: CategoryRenameSchema):
     if not old or not new:
         raise HTTPException(400, "Kategori adı boş olamaz")
 
-    cats = read_categories()
-    categories = cats.get("categories", [])
+    async with db_lock:
+        categories = (await read_categories()).get("categories", [])
 
-    exists_old = any(c["name"] == old for c in categories)
-    exists_new = any(c["name"] == new for c in categories)
+        exists_old = any(c["name"] == old for c in categories)
+        exists_new = any(c["name"] == new for c in categories)
 
-    if not exists_old:
-        raise HTTPException(404, "Eski kategori bulunamadı")
+        if not exists_old:
+            raise HTTPException(404, "Eski kategori bulunamadı")
 
-    # ⚠️ Aynı isim varsa
-    if exists_new and not data.merge:
-        return {
-            "status": "conflict",
-            "message": "Kategori zaten var",
-            "canMerge": True
-        }
+        # ⚠️ Aynı isim varsa
+        if exists_new and not data.merge:
+            return {
+                "status": "conflict",
+                "message": "Kategori zaten var",
+                "canMerge": True
+            }
 
-    # =====================
-    # KATEGORİ LİSTESİ
-    # =====================
-    new_categories = []
-    for c in categories:
-        if c["name"] == old:
-            if not exists_new:
-                new_categories.append({ "name": new })
-        else:
-            new_categories.append(c)
+        # =====================
+        # KATEGORİ LİSTESİ
+        # =====================
+        new_categories = []
+        for c in categories:
+            if c["name"] == old:
+                if not exists_new:
+                    new_categories.append({ "name": new })
+            else:
+                new_categories.append(c)
+
+        # =====================
+        # GÖRSELLER (çöptekiler dahil, tek op)
+        # =====================
+        since = store.revision
+        with store.transaction():
+            related = store.list_by_category(old, include_deleted=True)
+            store.bulk_update([img["id"] for img in related], {"category": new})
+        await write_categories({ "categories": new_categories })
+
+    await broadcast_changes(since, categories=new_categories)
 
-    write_categories({ "categories": new_categories })
+    return {
+        "status": "merged" if exists_new else "renamed",
+        "old": old,
+        "new": new,
+        "affected": len(related)
+    }
 
-    # =====================
-    # GÖRSELLER
-    # =====================
-    images = read_db()
-    for img in images:
-        if img.get("category") == old:
-            img["category"] = new
 
-    write_db(images)
+@app.post("/images/bulk")
+async def bulk_images(data: BulkImageSchema):
+    if data.action not in ("recategorize", "trash", "restore"):
+        raise HTTPException(400, "Geçersiz işlem")
+    if data.action == "recategorize" and not data.category:
+        raise HTTPException(400, "category gerekli")
+
+    async with db_lock:
+        # Tek geçişte uygun görselleri ayıkla
+        ids, skipped = [], []
+        for img_id in dict.fromkeys(data.ids):
+            img = store.get_by_id(img_id)
+            if img is None:
+                skipped.append({"id": img_id, "reason": "not_found"})
+            elif data.action == "trash" and img.get("isFavorite"):
+                skipped.append({"id": img_id, "reason": "favorite"})
+            else:
+                ids.append(img_id)
+
+        if data.action == "recategorize":
+            fields = {"category": data.category}
+        elif data.action == "trash":
+            fields = {"isDeleted": True}
+        else:
+            fields = {"isDeleted": False}
+            if data.category:
+                fields["category"] = data.category
+
+        since = store.revision
+        with store.transaction():
+            affected = store.bulk_update(ids, fields)
+
+    await broadcast_changes(since)
 
     return {
-        "status": "merged" if exists_new else "renamed",
-        "old": old,
-        "new": new
+        "status": "ok",
+        "affected": affected,
+        "skipped": skipped
     }
 
 
 @app.patch("/images/toggle-favorite/{image_id}")
 async def toggle_favorite(image_id: str):
     async with db_lock:
-        db = read_db()
-        updated = None
-
-        for img in db:
-            if img["id"] == image_id:
-                # 🗑️ Çöpteyse favori yapılamaz
-                if img.get("isDeleted"):
-                    raise HTTPException(400, "Silinmiş görsel favori yapılamaz")
-
-                img["isFavorite"] = not img.get("isFavorite", False)
-                updated = img
-                break
+        img = store.get_by_id(image_id)
 
-        if not updated:
+        if not img:
             raise HTTPException(404, "Görsel bulunamadı")
 
-        write_db(db)
+        # 🗑️ Çöpteyse favori yapılamaz
+        if img.get("isDeleted"):
+            raise HTTPException(400, "Silinmiş görsel favori yapılamaz")
+
+        updated = store.update_fields(image_id, {"isFavorite": not img.get("isFavorite", False)})
 
         # 🔔 Frontend’e haber ver
         await manager.broadcast({
             "type": "FAVORITE_TOGGLED",
+            "revision": store.revision,
             "payload": {
                 "id": image_id,
                 "isFavorite": updated["isFavorite"]
@@ -498,21 +958,17 @@ async def change_category(payload: dict):
     restore = payload.get("restore", False)
 
     async with db_lock:
-        db = read_db()
-
-        for img in db:
-            if img["id"] == img_id:
-                img["category"] = category
-                if restore:
-                    img["isDeleted"] = False
-                break
-        else:
-            raise HTTPException(404, "Görsel bulunamadı")
+        fields = {"category": category}
+        if restore:
+            fields["isDeleted"] = False
 
-        write_db(db)
+        if not store.update_fields(img_id, fields):
+            raise HTTPException(404, "Görsel bulunamadı")
+        revision = store.revision
 
     await manager.broadcast({
         "type": "IMAGE_UPDATED",
+        "revision": revision,
         "payload": {
             "id": img_id,
             "category": category,
@@ -527,79 +983,67 @@ async def change_category(payload: dict):
 @app.delete("/empty-trash")
 async def empty_trash():
     async with db_lock:
-        data = read_db()
-        
         # 1. Silinecek olanları (isDeleted=True olanları) ayıkla
-        trash_items = [img for img in data if img.get("isDeleted", False)]
+        trash_items = store.list_deleted()
         
-        # 2. Bu silinecekler arasında 'isSafe' olanların dosyalarını diskten sil
-        for img in trash_items:
-            if img.get("isSafe") and img.get("SafePath"):
-                safe_path = os.path.normpath(img["SafePath"])
-                try:
-                    if os.path.exists(safe_path):
-                        os.remove(safe_path)
-                        print(f"🗑️ Diskten silindi: {safe_path}")
-                except Exception as e:
-                    print(f"⚠️ Dosya silinirken hata ( {safe_path} ): {e}")
-
-        # 3. Veritabanını temizle (isDeleted olmayanları tut)
-        new_data = [img for img in data if not img.get("isDeleted", False)]
-        write_db(new_data)
+        # 2. Veritabanını temizle (isDeleted olmayanları tut)
+        trash_ids = [img["id"] for img in trash_items]
+        store.delete(trash_ids)
+        for img_id in trash_ids:
+            similar_index.remove(img_id)
+
+        # 3. Kalkan dosyalarından artık hiçbir görselin kullanmadıklarını sil
+        await safe_storage.release(trash_items)
 
         # 📡 Sinyali gönder
         await manager.broadcast({
-            "type": "TRASH_EMPTIED"
+            "type": "TRASH_EMPTIED",
+            "revision": store.revision
         })
 
+    # Küçük resimler kilit dışında, I/O havuzunda silinir
+    await io_executor.run(thumbnails.remove_many, trash_ids)
     return {"message": "Geri dönüşüm kutusu ve fiziksel dosyalar temizlendi"}
 
 @app.delete("/images/permanent-delete/{img_id}")
 async def permanent_delete(img_id: str):
-    data = read_db()
-    img = next((i for i in data if i["id"] == img_id), None)
-    
+    img = store.get_by_id(img_id)
+
     if not img:
         raise HTTPException(status_code=404, detail="Görsel bulunamadı")
 
-    # 🔥 KRİTİK NOKTA: Eğer görsel kalkandaysa dosyayı diskten sil
-    if img.get("isSafe") and img.get("SafePath"):
-        safe_path = os.path.normpath(img["SafePath"])
-        try:
-            if os.path.exists(safe_path):
-                os.remove(safe_path)
-                print(f"🗑️ Dosya diskten silindi: {safe_path}")
-        except Exception as e:
-            print(f"⚠️ Dosya silinirken hata oluştu: {e}")
+    # Veritabanından görseli kaldır
+    store.delete([img_id])
+    similar_index.remove(img_id)
+    await io_executor.run(thumbnails.remove, img_id)
+
+    # 🔥 KRİTİK NOKTA: Kalkan dosyası başka görselle paylaşılmıyorsa diskten sil
+    await safe_storage.release([img])
+
+    await manager.broadcast({
+        "type": "IMAGE_REMOVED",
+        "revision": store.revision,
+        "payload": { "id": img_id }
+    })
 
-    # Veritabanından (JSON) görseli kaldır
-    new_data = [i for i in data if i["id"] != img_id]
-    write_db(new_data)
-    
     return {"status": "success", "message": "Görsel ve yerel dosya silindi"}
 
 @app.patch("/images/{image_id}/trash")
 async def move_image_to_trash(image_id: str):
     async with db_lock:
-        db = read_db()
-        updated = False
-
-        for img in db:
-            if img["id"] == image_id:
-                if img.get("isFavorite"):
-                    raise HTTPException(400, "Favoriler silinemez")
-
-                img["isDeleted"] = True
-                updated = True
-                break
+        img = store.get_by_id(image_id)
 
-        if not updated:
+        if not img:
             raise HTTPException(404, "Görsel bulunamadı")
 
-        write_db(db)
+        if img.get("isFavorite"):
+            raise HTTPException(400, "Favoriler silinemez")
+
+        store.update_fields(image_id, {"isDeleted": True})
 
         await manager.broadcast({
             "type": "IMAGE_TRASHED",
+            "revision": store.revision,
             "payload": { "id": image_id }
         })
 
@@ -612,7 +1056,8 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            await websocket.receive_text()  # ping için
+            await websocket.receive_text()  # PING cevabı / canlılık sinyali
+            manager.touch(websocket)
     except:
         manager.disconnect(websocket)
 
@@ -625,68 +1070,115 @@ async def get_safe_file(path: str):
     return {"error": "Dosya yok"}
 
 
-@app.post("/images/{img_id}/proxy-enable")
-async def enable_proxy(img_id: str):
-    data = read_db()
-    updated_img = None
-
-    for img in data:
-        if img["id"] == img_id:
-            img["isCORS"] = True
-            # URL'i tam olarak güvenli hale getiriyoruz
-            original_url = img['originalUrl']
-            encoded_url = urllib.parse.quote(original_url, safe='') # safe='' tüm karakterleri kodlar
-            
-            # weserv.nl bazen çok uzun URL'lerde sorun yaşayabilir, 
-            # alternatif olarak doğrudan orijinali de saklayabiliriz.
-            img["ProxyUrl"] = f"https://images.weserv.nl/?url={encoded_url}&default={encoded_url}"
-            updated_img = img
-            break
-
-    if updated_img:
-        write_db(data)
-        return updated_img
-    
-    raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+async def thumbnail_source(img: dict, fetch: bool = True) -> Optional[str]:
+    # Önce kalkan altındaki yerel dosya, yoksa proxy önbelleğindeki kopya;
+    # fetch=False ise önbellekte olmayan görsel indirilmez
+    if img.get("isSafe") and img.get("SafePath"):
+        safe_path = os.path.normpath(img["SafePath"])
+        if os.path.exists(safe_path):
+            return safe_path
 
-@app.get("/proxy/image")
-async def proxy_image(url: str):
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/121.0.0.0 Safari/537.36"
-        ),
-        "Referer": "https://www.instagram.com/",
-        "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
-    }
+    meta = proxy_cache.lookup(img["originalUrl"])
+    if meta is None and fetch:
+        try:
+            _, _, body = await image_proxy.fetch(img["originalUrl"], {})
+            async for _ in body:
+                pass
+        except Exception:
+            return None
+        meta = proxy_cache.lookup(img["originalUrl"])
+    return proxy_cache.data_path(meta["key"]) if meta else None
+
+
+@app.get("/thumb/{img_id}")
+async def get_thumbnail(img_id: str, w: Optional[int] = None):
+    img = store.get_by_id(img_id)
+    if not img:
+        raise HTTPException(404, "Görsel bulunamadı")
+
+    if not thumbnails.available:
+        raise HTTPException(501, "Küçük resim desteği için Pillow kurulu değil")
+
+    src = await thumbnail_source(img)
+    if not src:
+        raise HTTPException(404, "Kaynak görsel alınamadı")
 
     try:
-        async with AsyncClient(
-            follow_redirects=True,
-            timeout=20
-        ) as client:
-            resp = await client.get(url, headers=headers)
+        path = await thumbnails.get(img_id, src, pick_size(w))
+    except Exception as e:
+        print(f"⚠️ Küçük resim üretilemedi ({img_id}): {e}")
+        raise HTTPException(415, "Küçük resim üretilemedi")
 
-        if resp.status_code != 200:
-            raise HTTPException(
-                status_code=resp.status_code,
-                detail="Image fetch failed"
-            )
+    return FileResponse(
+        path,
+        media_type="image/webp",
+        headers={"Cache-Control": "public, max-age=2592000"}
+    )
 
-        content_type = resp.headers.get("content-type", "image/jpeg")
 
-        return Response(
-            content=resp.content,
-            media_type=content_type,
-            headers={
-                "Cache-Control": "public, max-age=86400"
-            }
-        )
+@app.get("/images/{img_id}/similar")
+async def get_similar(img_id: str, distance: int = 10, limit: int = 50):
+    img = store.get_by_id(img_id)
+    if not img:
+        raise HTTPException(404, "Görsel bulunamadı")
+
+    if not similar_index.available:
+        raise HTTPException(501, "Benzerlik araması için Pillow kurulu değil")
+
+    # Arka plan kuyruğu henüz bu görsele gelmediyse hemen hesapla
+    if not await similar_index.ensure(img):
+        raise HTTPException(404, "Kaynak görsel alınamadı")
+
+    matches = similar_index.similar(img_id, max(0, min(distance, 32)), max(1, min(limit, 500)))
+    return {
+        "id": img_id,
+        "items": [dict(store.get_by_id(m["id"]), distance=m["distance"]) for m in matches]
+    }
+
+
+@app.post("/images/{img_id}/proxy-enable")
+async def enable_proxy(img_id: str):
+    img = store.get_by_id(img_id)
+
+    if img:
+        # URL'i tam olarak güvenli hale getiriyoruz
+        original_url = img['originalUrl']
+        encoded_url = urllib.parse.quote(original_url, safe='') # safe='' tüm karakterleri kodlar
 
+        # Üçüncü parti servis (weserv.nl) yerine kendi disk önbellekli proxy'miz
+        updated = store.update_fields(img_id, {
+            "isCORS": True,
+            "ProxyUrl": f"{PROXY_BASE}?url={encoded_url}"
+        })
+
+        await manager.broadcast({
+            "type": "IMAGE_UPDATED",
+            "revision": store.revision,
+            "payload": { "id": img_id, "isCORS": True, "ProxyUrl": updated["ProxyUrl"] }
+        })
+        return updated
+    
+    raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+
+@app.get("/proxy/stats")
+async def get_proxy_stats():
+    return proxy_cache.metrics()
+
+@app.get("/proxy/image")
+async def proxy_image(url: str, request: Request):
+    try:
+        status, headers, body = await image_proxy.fetch(url, dict(request.headers))
+    except UpstreamError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers.setdefault("content-type", "image/jpeg")
+    headers["Cache-Control"] = "public, max-age=86400"
+
+    # Gövde parça parça aktarılır, görselin tamamı belleğe alınmaz
+    return StreamingResponse(body, status_code=status, headers=headers)
+
 # =====================
 # DEV ENTRY
 # =====================
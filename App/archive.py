@@ -0,0 +1,487 @@
+import io
+import os
+import uuid
+import hashlib
+import shutil
+import asyncio
+import tarfile
+import zipfile
+import tempfile
+from typing import Optional, Dict, List, Tuple, AsyncIterator, Callable, Awaitable, IO
+
+from canonical import canonical_key
+from iopool import IOExecutor
+from serialize import dumps, loads
+
+
+# =====================
+# EXPORT / IMPORT
+# =====================
+# NDJSON: ilk satır {"_meta": {...}} (sürüm, kategoriler), sonraki her satır
+# bir görsel kaydı. Paket (tar/zip): "archive.ndjson" + "safe/<dosya adı>".
+# Hiçbir aşamada arşivin tamamı belleğe alınmaz.
+EXPORT_FORMAT = "morgifile-export"
+EXPORT_VERSION = 1
+BUNDLE_RECORDS = "archive.ndjson"
+BUNDLE_SAFE_DIR = "safe/"
+PAGE_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+# Geçici dosyaya toplu yazım eşiği
+SPOOL_BYTES = 1024 * 1024
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "tar": "application/x-tar",
+    "zip": "application/zip",
+}
+
+
+async def iter_ndjson(store, categories: List[dict]) -> AsyncIterator[bytes]:
+    meta = {"_meta": {
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "revision": store.revision,
+        "count": store.count(),
+        "categories": categories,
+    }}
+    yield dumps(meta) + b"\n"
+
+    cursor = None
+    while True:
+        page, cursor = store.list_page(cursor, PAGE_SIZE)
+        if page:
+            yield b"".join(dumps(r) + b"\n" for r in page)
+        if cursor is None:
+            break
+        # Büyük arşivde event loop'u kilitleme
+        await asyncio.sleep(0)
+
+
+class _QueueWriter(io.RawIOBase):
+    # tarfile / zipfile'ın thread'de yazdığı baytları event loop'taki kuyruğa
+    # aktarır; kuyruk dolunca yazan taraf bekler (sabit bellek)
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+        self.buffer = bytearray()
+        self.cancelled = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.cancelled:
+            raise OSError("export iptal edildi")
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self.buffer and not self.cancelled:
+            chunk, self.buffer = bytes(self.buffer), bytearray()
+            asyncio.run_coroutine_threadsafe(self.queue.put(chunk), self.loop).result()
+
+
+def _safe_files(records: IO[bytes]) -> List[str]:
+    # Aynı içerik birden çok kayıtta olabilir: her dosya bir kez
+    seen: Dict[str, str] = {}
+    records.seek(0)
+    for line in records:
+        record = loads(line)
+        path = record.get("SafePath")
+        if record.get("isSafe") and path:
+            path = os.path.normpath(path)
+            if os.path.exists(path):
+                seen.setdefault(os.path.basename(path), path)
+    return list(seen.values())
+
+
+def _write_bundle(fmt: str, records: IO[bytes], out: _QueueWriter):
+    files = _safe_files(records)
+    size = records.seek(0, os.SEEK_END)
+    records.seek(0)
+
+    if fmt == "tar":
+        with tarfile.open(fileobj=out, mode="w|") as tar:
+            info = tarfile.TarInfo(BUNDLE_RECORDS)
+            info.size = size
+            tar.addfile(info, records)
+            for path in files:
+                tar.add(path, arcname=BUNDLE_SAFE_DIR + os.path.basename(path))
+    else:
+        # Görseller zaten sıkıştırılmış: yalnızca NDJSON deflate edilir
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            info = zipfile.ZipInfo(BUNDLE_RECORDS)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(info, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(records, dst, CHUNK_SIZE)
+            for path in files:
+                zf.write(path, BUNDLE_SAFE_DIR + os.path.basename(path))
+    out.flush()
+
+
+async def iter_bundle(store, categories: List[dict], fmt: str, executor: IOExecutor) -> AsyncIterator[bytes]:
+    # 1. Kayıtların anlık görüntüsü diske (tar üyesinin boyutu önceden bilinmeli)
+    records = await executor.run(tempfile.TemporaryFile)
+    try:
+        async for data in iter_ndjson(store, categories):
+            await executor.run(records.write, data)
+
+        # 2. Arşiv thread'de yazılır, parçalar kuyruktan akıtılır
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=16)
+        out = _QueueWriter(loop, queue)
+
+        def produce():
+            try:
+                _write_bundle(fmt, records, out)
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop)
+
+        # Yazan thread arşiv bitene kadar havuzdan bir işçiyi tutar
+        task = asyncio.ensure_future(executor.run(produce))
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+            await task
+        finally:
+            # İstemci yarıda koptuysa yazan thread'i serbest bırak
+            out.cancelled = True
+            while not task.done():
+                while not queue.empty():
+                    queue.get_nowait()
+                await asyncio.sleep(0.01)
+    finally:
+        await executor.run(records.close)
+
+
+# =====================
+# IMPORT
+# =====================
+def detect_format(head: bytes) -> str:
+    if head.startswith(b"PK\x03\x04"):
+        return "zip"
+    if head.startswith(b"\x1f\x8b") or head[257:262] == b"ustar":
+        return "tar"
+    return "ndjson"
+
+
+def _safe_member_name(name: str) -> Optional[str]:
+    # Yalnızca "safe/<dosya>"; yol geçişi (../) kabul edilmez
+    if not name.startswith(BUNDLE_SAFE_DIR):
+        return None
+    base = os.path.basename(name)
+    return base if base and base == name[len(BUNDLE_SAFE_DIR):] and not base.startswith(".") else None
+
+
+def unpack_bundle(upload: IO[bytes], fmt: str, records: IO[bytes]) -> Dict[str, str]:
+    # Thread'de çalışır: kayıtlar geçici NDJSON'a kopyalanır, Safe dosyaları
+    # yerinde bırakılır; dönüş: dosya adı -> paketteki üye adı
+    members: Dict[str, str] = {}
+    if fmt == "zip":
+        with zipfile.ZipFile(upload) as zf:
+            for info in zf.infolist():
+                if info.filename == BUNDLE_RECORDS:
+                    with zf.open(info) as src:
+                        shutil.copyfileobj(src, records, CHUNK_SIZE)
+                elif _safe_member_name(info.filename):
+                    members.setdefault(_safe_member_name(info.filename), info.filename)
+    else:
+        with tarfile.open(fileobj=upload, mode="r:*") as tar:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                if member.name == BUNDLE_RECORDS:
+                    shutil.copyfileobj(tar.extractfile(member), records, CHUNK_SIZE)
+                elif _safe_member_name(member.name):
+                    members.setdefault(_safe_member_name(member.name), member.name)
+    records.seek(0)
+    return members
+
+
+def _copy_hashed(src: IO[bytes], dst_path: str) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(dst_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def extract_members(upload: IO[bytes], fmt: str, targets: Dict[str, str]) -> Dict[str, Tuple[str, int]]:
+    # Thread'de çalışır: istenen üyeleri geçici yollara yazar, içerik özetini
+    # paketteki ada güvenmeden yeniden hesaplar. Çıkarılamayanlar sonuçta yok.
+    done: Dict[str, Tuple[str, int]] = {}
+    upload.seek(0)
+    if fmt == "zip":
+        with zipfile.ZipFile(upload) as zf:
+            for name, dst_path in targets.items():
+                try:
+                    with zf.open(name) as src:
+                        done[name] = _copy_hashed(src, dst_path)
+                except (OSError, KeyError, zipfile.BadZipFile) as e:
+                    print(f"⚠️ Paketten dosya çıkarılamadı ( {name} ): {e}")
+    else:
+        with tarfile.open(fileobj=upload, mode="r:*") as tar:
+            for name, dst_path in targets.items():
+                try:
+                    done[name] = _copy_hashed(tar.extractfile(name), dst_path)
+                except (OSError, KeyError, tarfile.TarError) as e:
+                    print(f"⚠️ Paketten dosya çıkarılamadı ( {name} ): {e}")
+    return done
+
+
+class ArchiveImporter:
+    def __init__(
+        self,
+        store,
+        safe_storage,
+        executor: IOExecutor,
+        on_commit: Optional[Callable[[int, List[dict]], Awaitable[None]]] = None,
+        batch_size: int = PAGE_SIZE,
+        lock=None,
+    ):
+        self.store = store
+        # Paketteki dosyalar SafeStorage.ingest ile yerleşir (kilit + pin)
+        self.safe_storage = safe_storage
+        self.on_commit = on_commit
+        self.batch_size = batch_size
+        # Dosya işleri event loop dışında, paylaşılan I/O havuzunda
+        self.io = executor.run
+        # Tekilleştirme + yazım, diğer ekleme uçlarıyla aynı kilit altında (db_lock)
+        self.lock = lock or asyncio.Lock()
+
+    async def run(self, chunks: AsyncIterator[bytes], fmt: str = "auto") -> dict:
+        result = {"format": fmt, "imported": 0, "skipped": 0, "invalid": 0, "categories": []}
+        upload = await self.io(tempfile.TemporaryFile)
+        records = await self.io(tempfile.TemporaryFile)
+        try:
+            # 1. Gövde parça parça diske (bellekte en fazla SPOOL_BYTES)
+            head = b""
+            pending: List[bytes] = []
+            pending_size = 0
+            async for chunk in chunks:
+                if len(head) < 512:
+                    head += chunk[:512 - len(head)]
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= SPOOL_BYTES:
+                    await self.io(upload.writelines, pending)
+                    pending, pending_size = [], 0
+            await self.io(upload.writelines, pending)
+            if fmt == "auto":
+                fmt = result["format"] = detect_format(head)
+
+            # 2. Paket ise kayıtları ayır; Safe dosyaları yalnızca içe aktarılan
+            #    kayıtlar için, parti parti çıkarılır
+            bundle = (upload, fmt, {})
+            if fmt == "ndjson":
+                records, upload = upload, records
+                await self.io(records.seek, 0)
+            else:
+                await self.io(upload.seek, 0)
+                bundle = (upload, fmt, await self.io(unpack_bundle, upload, fmt, records))
+
+            # 3. Kayıtları parti parti işle (satırlar diskten blok blok okunur)
+            batch: List[dict] = []
+            while True:
+                lines = await self.io(records.readlines, SPOOL_BYTES)
+                if not lines:
+                    break
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = loads(line)
+                    except ValueError:
+                        result["invalid"] += 1
+                        continue
+                    if not isinstance(record, dict):
+                        result["invalid"] += 1
+                    elif "_meta" in record:
+                        result["categories"] = record["_meta"].get("categories") or []
+                    else:
+                        batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        await self._import_batch(batch, result, bundle)
+                        batch = []
+            await self._import_batch(batch, result, bundle)
+        finally:
+            await self.io(upload.close)
+            await self.io(records.close)
+        return result
+
+    def _prepare(self, record: dict, seen: set) -> Optional[dict]:
+        url = record.get("originalUrl")
+        if not isinstance(url, str) or not url:
+            return None
+        key = canonical_key(url, record.get("site"))
+        # Yarıda kalmış bir içe aktarma tekrar çalıştırılınca kaldığı yerden sürer
+        if key in seen or self.store.find_by_url(url) or self.store.find_by_key(key):
+            return {}
+        seen.add(key)
+
+        record = dict(record)
+        record["canonicalKey"] = key
+        if not record.get("id") or self.store.get_by_id(record["id"]):
+            record["id"] = str(uuid.uuid4())
+        return record
+
+    async def _attach_safe_files(self, records: List[dict], bundle: Tuple[IO[bytes], str, Dict[str, str]]) -> List[str]:
+        # Safe yolunu bu makinedeki depoya göre yeniden kur. Dönüş: ingest ile
+        # pinlenen özetler (kayıtlar store'a yazılınca bırakılmalı)
+        upload, fmt, members = bundle
+        wanted: Dict[str, List[dict]] = {}
+        for record in records:
+            if not record.get("isSafe") or not record.get("SafePath"):
+                continue
+            base = os.path.basename(os.path.normpath(record["SafePath"]))
+            if base in members:
+                wanted.setdefault(base, []).append(record)
+                continue
+            # Pakette yok: dosya bu makinede zaten duruyorsa onu kullan
+            local = os.path.join(self.safe_storage.root, base)
+            if base and await self.io(os.path.isfile, local):
+                record["SafePath"] = local
+            else:
+                _drop_safe(record)
+        if not wanted:
+            return []
+
+        targets = {members[base]: self.safe_storage.temp_path() for base in wanted}
+        try:
+            extracted = await self.io(extract_members, upload, fmt, targets)
+        except BaseException:
+            await self.io(_remove_all, list(targets.values()))
+            raise
+
+        pinned: List[str] = []
+        for base, owners in wanted.items():
+            name = members[base]
+            if name not in extracted:
+                await self.io(_remove_all, [targets[name]])
+                for record in owners:
+                    _drop_safe(record)
+                continue
+            digest, size = extracted[name]
+            final_path = await self.safe_storage.ingest(targets[name], digest, os.path.splitext(base)[1].lower())
+            pinned.append(digest)
+            for record in owners:
+                record.update(SafePath=final_path, safeHash=digest, safeSize=size)
+        return pinned
+
+    async def _import_batch(self, batch: List[dict], result: dict, bundle: Tuple[IO[bytes], str, Dict[str, str]]):
+        if not batch:
+            return
+        seen: set = set()
+        new_records = []
+        for record in batch:
+            prepared = self._prepare(record, seen)
+            if prepared is None:
+                result["invalid"] += 1
+            elif not prepared:
+                result["skipped"] += 1
+            else:
+                new_records.append(prepared)
+
+        pinned = await self._attach_safe_files(new_records, bundle)
+        late: List[dict] = []
+        try:
+            async with self.lock:
+                # Dosyalar yerleşirken başka bir istek aynı görseli eklemiş olabilir
+                fresh = []
+                for record in new_records:
+                    if self.store.find_by_url(record["originalUrl"]) or self.store.find_by_key(record["canonicalKey"]):
+                        late.append(record)
+                        continue
+                    if self.store.get_by_id(record["id"]):
+                        record["id"] = str(uuid.uuid4())
+                    fresh.append(record)
+                new_records = fresh
+                since = self.store.revision
+                # Parti tek journal kaydıyla yazılır
+                self.store.insert_many(new_records)
+        except BaseException:
+            for digest in pinned:
+                self.safe_storage.unpin(digest)
+            # Kayıtlar yazılamadı: yeni yerleşen dosyaları geri al
+            await self.safe_storage.release([r for r in new_records + late if r.get("safeHash")])
+            raise
+        for digest in pinned:
+            self.safe_storage.unpin(digest)
+        if late:
+            # Yalnızca bu partinin yerleştirdiği dosyalar; başka kayıt kullanıyorsa kalır
+            await self.safe_storage.release([r for r in late if r.get("safeHash")])
+        result["imported"] += len(new_records)
+        result["skipped"] += len(late)
+
+        if self.on_commit:
+            await self.on_commit(since, new_records)
+        await asyncio.sleep(0)
+
+
+def _drop_safe(record: dict):
+    record.update(isSafe=False, SafePath="")
+    record.pop("safeHash", None)
+    record.pop("safeSize", None)
+
+
+def _remove_all(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# =====================
+# CLI
+# =====================
+# Çalışan sunucuya karşı:
+#   python archive.py export yedek.tar --format tar
+#   python archive.py import yedek.tar
+def main():
+    import argparse
+    import httpx
+
+    parser = argparse.ArgumentParser(description="MorgiFile arşivini dışa / içe aktar")
+    parser.add_argument("--server", default="http://127.0.0.1:8000")
+    sub = parser.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export")
+    exp.add_argument("output")
+    exp.add_argument("--format", choices=sorted(MEDIA_TYPES), default="ndjson")
+    imp = sub.add_parser("import")
+    imp.add_argument("input")
+    imp.add_argument("--format", choices=["auto", *sorted(MEDIA_TYPES)], default="auto")
+    args = parser.parse_args()
+
+    with httpx.Client(base_url=args.server, timeout=None) as client:
+        if args.command == "export":
+            with client.stream("GET", "/export", params={"format": args.format}) as resp:
+                resp.raise_for_status()
+                tmp = args.output + ".part"
+                with open(tmp, "wb") as f:
+                    for chunk in resp.iter_bytes(CHUNK_SIZE):
+                        f.write(chunk)
+                os.replace(tmp, args.output)
+            print(f"📦 Dışa aktarıldı: {args.output}")
+        else:
+            def read_chunks():
+                with open(args.input, "rb") as f:
+                    yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+            resp = client.post("/import", params={"format": args.format}, content=read_chunks())
+            resp.raise_for_status()
+            print(f"📥 İçe aktarıldı: {resp.json()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import tempfile
+import argparse
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, List, Callable, Awaitable
+
+import httpx
+
+from canonical import canonical_key
+from iopool import LoopWatchdog
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# =====================
+# BENCHMARK
+# =====================
+# Sentetik bir arşiv üretir, app.py'yi geçici bir çalışma klasöründe
+# süreç içi ASGI istemcisiyle yük altında çalıştırır ve sonuçları JSON
+# olarak basar. Dış ağa çıkılmaz: proxy ve sağlık kontrolü yereldeki
+# sahte sunucuya gider.
+#
+#   python bench.py --records 100000 --concurrency 32 --output bench.json
+#   python bench.py generate ./arsiv --records 1000000
+#
+SITES = ("instagram", "pinterest", "twitter", "reddit")
+
+
+# =====================
+# SAHTE UPSTREAM
+# =====================
+def _sample_image() -> bytes:
+    if Image is None:
+        return b"\xff\xd8\xff\xe0" + os.urandom(4096)
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (120, 80, 200)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class StandInServer:
+    # "/dead/..." 404 döner, diğer her yol aynı küçük JPEG
+    def __init__(self):
+        body = _sample_image()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, with_body: bool):
+                if self.path.startswith("/dead/"):
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if with_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._reply(True)
+
+            def do_HEAD(self):
+                self._reply(False)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StandInServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# =====================
+# SENTETİK ARŞİV
+# =====================
+def category_names(count: int) -> List[str]:
+    return [f"bench-{i}" for i in range(count)]
+
+
+def generate_archive(
+    folder: str,
+    records: int,
+    categories: int = 50,
+    upstream: str = "http://127.0.0.1:9",
+    seed: int = 1,
+) -> Dict[str, str]:
+    # Eski formatta images.json + categories.json; liste belleğe alınmadan yazılır
+    rng = random.Random(seed)
+    names = category_names(categories)
+    images_path = os.path.join(folder, "images.json")
+    categories_path = os.path.join(folder, "categories.json")
+    os.makedirs(folder, exist_ok=True)
+
+    with open(images_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(records):
+            site = rng.choice(SITES)
+            dead = rng.random() < 0.03
+            url = f"{upstream}/{'dead' if dead else 'img'}/{site}/{i}.jpg"
+            record = {
+                "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "site": site,
+                "originalUrl": url,
+                "canonicalKey": canonical_key(url, site),
+                "ProxyUrl": "",
+                "SafePath": "",
+                "category": rng.choice(names),
+                "width": rng.randint(300, 2000),
+                "height": rng.randint(300, 2000),
+                "isFavorite": rng.random() < 0.1,
+                "isDeleted": rng.random() < 0.05,
+                "isDead": dead and rng.random() < 0.5,
+                "isCORS": False,
+                "isSafe": False,
+            }
+            f.write(("," if i else "") + json.dumps(record, ensure_ascii=False))
+        f.write("]")
+
+    with open(categories_path, "w", encoding="utf-8") as f:
+        json.dump({"categories": [{"name": n} for n in names]}, f, ensure_ascii=False)
+
+    return {"images": images_path, "categories": categories_path}
+
+
+# =====================
+# ÖLÇÜM
+# =====================
+def peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux KB, macOS bayt döner
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(
+    name: str,
+    count: int,
+    concurrency: int,
+    request: Callable[[int], Awaitable[int]],
+) -> dict:
+    # request(i) HTTP durum kodunu döner; >= 400 hata sayılır
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                status = await request(i)
+            except Exception:
+                status = 599
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, count)))))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "peak_rss_bytes": peak_rss(),
+    }
+    print(f"⏱️ {name}: {result['throughput_rps']} istek/sn, p50 {result['latency_ms']['p50']} ms, "
+          f"p99 {result['latency_ms']['p99']} ms, {errors} hata", file=sys.stderr)
+    return result
+
+
+# =====================
+# SENARYOLAR
+# =====================
+async def run_benchmark(args, upstream: str, workspace: str) -> dict:
+    # app.py göreli yollar ve APPDATA kullanır: geçici klasörde çalıştır
+    app_dir = os.path.join(workspace, "App")
+    os.makedirs(os.path.join(app_dir, "Dashboard", "database"), exist_ok=True)
+    os.makedirs(os.path.join(workspace, "Addon"), exist_ok=True)
+    os.makedirs(os.path.join(workspace, "home", "Downloads"), exist_ok=True)
+
+    started = time.perf_counter()
+    paths = generate_archive(
+        os.path.join(app_dir, "Dashboard", "database"), args.records, args.categories, upstream, args.seed
+    )
+    os.replace(paths["categories"], os.path.join(workspace, "Addon", "categories.json"))
+    generate_seconds = time.perf_counter() - started
+
+    os.environ["APPDATA"] = os.path.join(workspace, "appdata")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = os.path.join(workspace, "home")
+    os.chdir(app_dir)
+    import app as appmod
+
+    rng = random.Random(args.seed)
+    report: Dict[str, object] = {}
+
+    started = time.perf_counter()
+    async with appmod.app.router.lifespan_context(appmod.app):
+        load_seconds = time.perf_counter() - started
+        if not args.background:
+            # Sağlık taraması / benzerlik indeksi ölçümleri bozmasın
+            for task in list(appmod.background_tasks):
+                task.cancel()
+
+        transport = httpx.ASGITransport(app=appmod.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            ids = [img["id"] for img in appmod.store.all() if not img.get("isDeleted")]
+            names = category_names(args.categories)
+            n = args.requests
+            heavy = max(1, n // 20)
+
+            async def add_image(i):
+                resp = await client.post("/add-image", json={
+                    "site": "instagram", "originalUrl": f"{upstream}/img/new/{i}.jpg", "category": names[0],
+                })
+                return resp.status_code
+
+            async def toggle_favorite(i):
+                resp = await client.patch(f"/images/toggle-favorite/{rng.choice(ids)}")
+                return resp.status_code
+
+            async def change_category(i):
+                resp = await client.patch("/images/change-category", json={
+                    "id": rng.choice(ids), "category": rng.choice(names),
+                })
+                return resp.status_code
+
+            async def get_images(i):
+                resp = await client.get("/images")
+                return resp.status_code
+
+            async def get_images_page(i):
+                resp = await client.get("/images", params={"limit": 100, "isDeleted": False})
+                return resp.status_code
+
+            async def proxy_image(i):
+                resp = await client.get("/proxy/image", params={"url": f"{upstream}/img/proxy/{i}.jpg"})
+                return resp.status_code
+
+            async def proxy_image_cached(i):
+                resp = await client.get("/proxy/image", params={"url": f"{upstream}/img/proxy/{i % 10}.jpg"})
+                return resp.status_code
+
+            health_client = appmod.health_checker.client()
+
+            async def health_check(i):
+                # Uç nokta yok: zamanlayıcının yaptığı kontrol (HEAD + kayıt güncelleme) doğrudan ölçülür
+                img = appmod.store.get_by_id(rng.choice(ids))
+                status = await appmod.health_checker.check_image(health_client, img)
+                return 200 if status in (200, 404) else 500
+
+            # Her kategori bir kez yeniden adlandırılır, sonra ilk kategoriye taşınarak silinir
+            async def rename_category(i):
+                resp = await client.patch("/categories/rename", json={
+                    "oldName": names[i + 1], "newName": f"{names[i + 1]}-renamed",
+                })
+                return resp.status_code
+
+            async def delete_category(i):
+                resp = await client.request("DELETE", "/categories", json={
+                    "name": f"{names[i + 1]}-renamed", "action": "move_images", "moveTo": names[0],
+                })
+                return resp.status_code
+
+            scenarios = [
+                ("add_image", n, add_image),
+                ("toggle_favorite", n, toggle_favorite),
+                ("change_category", n, change_category),
+                ("get_images", heavy, get_images),
+                ("get_images_page", n, get_images_page),
+                ("proxy_image", heavy, proxy_image),
+                ("proxy_image_cached", n, proxy_image_cached),
+                ("health_check", heavy, health_check),
+                ("rename_category", len(names) - 1, rename_category),
+                ("delete_category", len(names) - 1, delete_category),
+            ]
+            # Bloklayan çağrılar: senaryo boyunca event loop gecikmesi bütçeyle karşılaştırılır
+            watchdog = LoopWatchdog(interval=0.01, budget=args.lag_budget / 1000, log=False)
+            watchdog_task = asyncio.create_task(watchdog.run())
+            selected = set(args.only.split(",")) if args.only else None
+            for name, count, request in scenarios:
+                if selected is None or name in selected:
+                    watchdog.reset()
+                    report[name] = await run_scenario(name, count, args.concurrency, request)
+                    report[name]["loop_lag"] = watchdog.stats()
+            watchdog_task.cancel()
+
+            await health_client.aclose()
+
+    return {
+        "records": args.records,
+        "categories": args.categories,
+        "concurrency": args.concurrency,
+        "generate_seconds": round(generate_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "peak_rss_bytes": peak_rss(),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "scenarios": report,
+        "loop_stalls": sum(r["loop_lag"]["stalls"] for r in report.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MorgiFile API benchmark")
+    parser.add_argument("command", nargs="?", choices=["run", "generate"], default="run")
+    parser.add_argument("folder", nargs="?", help="generate: arşivin yazılacağı klasör")
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=1000, help="senaryo başına istek (ağır senaryolar 1/20)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", help="virgülle ayrılmış senaryo adları")
+    parser.add_argument("--lag-budget", type=float, default=100, help="event loop gecikme bütçesi (ms)")
+    parser.add_argument("--fail-on-stall", action="store_true", help="bütçe aşıldıysa çıkış kodu 1")
+    parser.add_argument("--background", action="store_true", help="arka plan görevlerini çalışır bırak")
+    parser.add_argument("--keep", action="store_true", help="geçici çalışma klasörünü silme")
+    parser.add_argument("--output", help="JSON çıktı dosyası (varsayılan stdout)")
+    args = parser.parse_args()
+    if args.categories < 2:
+        parser.error("--categories en az 2 olmalı")
+
+    if args.command == "generate":
+        if not args.folder:
+            parser.error("generate için klasör gerekli")
+        print(json.dumps(generate_archive(args.folder, args.records, args.categories, seed=args.seed)))
+        return
+
+    # Uygulama logları stderr'e: stdout yalnızca JSON sonuç
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    workspace = tempfile.mkdtemp(prefix="morgifile-bench-")
+    cwd = os.getcwd()
+    try:
+        with StandInServer() as upstream, contextlib.redirect_stdout(sys.stderr):
+            result = asyncio.run(run_benchmark(args, upstream.base, workspace))
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"📁 Çalışma klasörü: {workspace}", file=sys.stderr)
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.fail_on_stall and result["loop_stalls"]:
+        print(f"❌ Event loop {result['loop_stalls']} kez {args.lag_budget} ms bütçesini aştı", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
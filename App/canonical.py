@@ -0,0 +1,132 @@
+import re
+import posixpath
+import urllib.parse
+from typing import Callable, Optional, List, Tuple
+
+
+# =====================
+# URL CANONICALIZATION
+# =====================
+# Aynı görselin imzalı token, boyut parametresi veya takip parametresi
+# farkıyla tekrar kaydedilmesini önlemek için URL'den site bazlı bir
+# "kanonik anahtar" üretilir. Yeni site kuralı eklemek için:
+#
+#   @canonicalizer("example.com", "cdn.example.net")
+#   def _example(parts): return "example:" + ...
+#
+# Alan adları hem görselin host'u (CDN) hem de eklentinin gönderdiği "site"
+# (ör. "www.instagram.com") için eşleşir; site host'undaki sayfa URL'lerinde
+# kural None dönüp genel anahtara düşmeli.
+#
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "igshid", "mc_cid", "mc_eid", "ref", "ref_src", "si", "_ga",
+}
+
+Canonicalizer = Callable[[urllib.parse.SplitResult], Optional[str]]
+_RULES: List[Tuple[str, Canonicalizer]] = []
+
+
+def canonicalizer(*domains: str):
+    def register(fn: Canonicalizer) -> Canonicalizer:
+        for domain in domains:
+            _RULES.append((domain.lower(), fn))
+        # Daha uzun (daha özel) alan adı önce eşleşsin
+        _RULES.sort(key=lambda rule: -len(rule[0]))
+        return fn
+    return register
+
+
+def _domain_matches(host: str, domain: str) -> bool:
+    return host == domain or host.endswith("." + domain)
+
+
+def _rule_for(host: str) -> Optional[Canonicalizer]:
+    for domain, fn in _RULES:
+        if _domain_matches(host, domain):
+            return fn
+    return None
+
+
+def generic_key(parts: urllib.parse.SplitResult) -> str:
+    # Şema/host küçük harf, fragment yok, takip parametreleri atılmış, sıralı query
+    query = sorted(
+        (k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith("utm_")
+    )
+    path = posixpath.normpath(parts.path) if parts.path else "/"
+    netloc = parts.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    return f"{netloc}{path}" + (f"?{urllib.parse.urlencode(query)}" if query else "")
+
+
+def canonical_key(url: str, site: Optional[str] = None) -> str:
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+    except ValueError:
+        return url
+    if not parts.netloc:
+        # Yerel dosya / göreli yol: olduğu gibi
+        return url
+
+    # Önce görselin kendi host'u (CDN), sonra eklentinin gönderdiği site
+    host = (parts.hostname or "").lower()
+    for candidate in (host, (site or "").lower()):
+        fn = _rule_for(candidate) if candidate else None
+        if fn is not None:
+            key = fn(parts)
+            if key:
+                return key
+    return generic_key(parts)
+
+
+# =====================
+# SITE RULES
+# =====================
+_SIZE_SEGMENT = re.compile(r"^(\d+x\d*|originals|\d+x)$")
+# Dosya adına dayanan kurallar yalnızca medya dosyalarında: "photo.php" gibi
+# sayfa adları farklı görselleri tek anahtarda birleştirmesin
+_MEDIA_NAME = re.compile(r"\.(jpe?g|png|webp|gif|avif|heic|mp4)$", re.IGNORECASE)
+
+
+@canonicalizer("cdninstagram.com", "fbcdn.net", "instagram.com", "facebook.com")
+def _instagram(parts: urllib.parse.SplitResult) -> Optional[str]:
+    # ".../t51.2885-15/123_456_789_n.jpg?stp=dst-jpg_e35_s1080x1080&_nc_ht=...&oh=...&oe=..."
+    # Boyut (stp) ve imza (oh/oe/_nc_*) değişse de dosya adı aynı kalır
+    name = posixpath.basename(parts.path)
+    return f"meta:{name}" if _MEDIA_NAME.search(name) else None
+
+
+@canonicalizer("pinimg.com", "pinterest.com")
+def _pinterest(parts: urllib.parse.SplitResult) -> Optional[str]:
+    # "/236x/ab/cd/ef/abcdef....jpg" ile "/originals/ab/cd/ef/abcdef....jpg" aynı pin
+    segments = [s for s in parts.path.split("/") if s]
+    if segments and _SIZE_SEGMENT.match(segments[0]):
+        segments = segments[1:]
+    if not segments:
+        return None
+    return "pin:" + posixpath.splitext("/".join(segments))[0]
+
+
+@canonicalizer("twimg.com", "twitter.com", "x.com")
+def _twitter(parts: urllib.parse.SplitResult) -> Optional[str]:
+    # "/media/ID?format=jpg&name=small" ve eski "/media/ID.jpg:large"
+    if not parts.path.startswith("/media/"):
+        return None
+    media = parts.path[len("/media/"):].split(":")[0]
+    return "tw:" + posixpath.splitext(media)[0]
+
+
+@canonicalizer("redd.it", "redditmedia.com", "reddit.com")
+def _reddit(parts: urllib.parse.SplitResult) -> Optional[str]:
+    # preview.redd.it/<ad>.jpg?width=640&auto=webp&s=<imza> -> i.redd.it/<ad>.jpg
+    name = posixpath.basename(parts.path)
+    if not _MEDIA_NAME.search(name):
+        return None
+    return "reddit:" + posixpath.splitext(name)[0]
+
+
+@canonicalizer("googleusercontent.com", "ggpht.com")
+def _google(parts: urllib.parse.SplitResult) -> Optional[str]:
+    # ".../<id>=w1200-h800-rw" boyut eki "=" sonrasında
+    return "google:" + parts.path.split("=")[0]
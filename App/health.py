@@ -0,0 +1,362 @@
+import time
+import heapq
+import asyncio
+import itertools
+import urllib.parse
+from collections import deque
+from typing import Optional, Dict, Callable, Awaitable, List, Tuple
+
+import httpx
+
+
+# =====================
+# LINK HEALTH CHECK
+# =====================
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/121.0.0.0 Safari/537.36"
+    ),
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+}
+
+# HEAD'i desteklemeyen / yanlış cevaplayan CDN'ler için GET denenir
+HEAD_FALLBACK_STATUSES = {400, 403, 405, 501}
+
+
+def is_dead_status(status: Optional[int]) -> bool:
+    # 404, 410 vb. kalıcı hata; 408/429 ve 5xx geçici sayılır
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+def is_transient_status(status) -> bool:
+    # None / "error" = bağlantı hatası
+    return not isinstance(status, int) or status in (408, 429) or status >= 500
+
+
+def host_of(url: str) -> str:
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+
+class HealthChecker:
+    def __init__(
+        self,
+        store,
+        concurrency: int = 32,
+        per_host: int = 4,
+        timeout: float = 10,
+        on_dead: Optional[Callable[[dict], Awaitable[None]]] = None,
+        event_hooks: Optional[Dict[str, list]] = None,
+    ):
+        self.store = store
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.on_dead = on_dead
+        self.event_hooks = event_hooks
+
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        sem = self._host_limits.get(host)
+        if sem is None:
+            sem = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+    @staticmethod
+    def needs_check(img: dict) -> bool:
+        # Zaten ölü olarak işaretlenmişse veya yerel dosyaysa atla
+        return not img.get("isDead") and not img.get("originalUrl", "").startswith("images/")
+
+    async def probe(self, client: httpx.AsyncClient, url: str) -> int:
+        # Önce sadece başlıklar; olmazsa tek byte'lık ranged GET
+        async with self._host_limit(host_of(url)):
+            resp = await client.head(url)
+            if resp.status_code not in HEAD_FALLBACK_STATUSES:
+                return resp.status_code
+            async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as resp:
+                return resp.status_code
+
+    async def check_image(self, client: httpx.AsyncClient, img: dict) -> Optional[int]:
+        status = None
+        try:
+            status = await self.probe(client, img["originalUrl"])
+        except (httpx.HTTPError, ValueError) as e:
+            # Zaman aşımı / bağlantı hatası: internet kesik olabilir, ölü sayma
+            print(f"⚠️ Bağlantı hatası ({img['id']}): {e}")
+
+        fields = {
+            "lastCheckedAt": int(time.time()),
+            "healthStatus": status if status is not None else "error",
+        }
+        dead = is_dead_status(status)
+        if dead:
+            fields["isDead"] = True
+
+        # Kontrol sürerken silinmiş olabilir
+        updated = self.store.update_fields(img["id"], fields)
+
+        if dead and updated:
+            print(f"💀 Ölü görsel tespit edildi (Status {status}): {img['id']}")
+            if self.on_dead:
+                await self.on_dead(updated)
+        return status
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=self.timeout,
+            headers=DEFAULT_HEADERS,
+            event_hooks=self.event_hooks,
+            limits=httpx.Limits(max_connections=self.concurrency),
+        )
+
+
+# =====================
+# REVALIDATION SCHEDULER
+# =====================
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.failures = 0
+        self.blocked_until = 0.0
+
+    def take(self) -> float:
+        # Token alınabildiyse 0, yoksa beklenmesi gereken süre
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def backoff(self, base: float, cap: float):
+        # 429 / 5xx: 2^n ile artan bekleme
+        delay = min(cap, base * (2 ** self.failures))
+        self.failures += 1
+        self.blocked_until = time.monotonic() + delay
+
+    def success(self):
+        self.failures = 0
+
+
+class RevalidationScheduler:
+    def __init__(
+        self,
+        store,
+        checker: HealthChecker,
+        interval: float = 7 * 86400,
+        favorite_interval: float = 86400,
+        retry_interval: float = 3600,
+        rate: float = 1.0,
+        burst: int = 5,
+        concurrency: int = 8,
+        backoff_base: float = 30,
+        backoff_cap: float = 3600,
+    ):
+        self.store = store
+        self.checker = checker
+        self.interval = interval
+        self.favorite_interval = favorite_interval
+        self.retry_interval = retry_interval
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self._heap: List[Tuple[float, int, str]] = []
+        self._queued: Dict[str, float] = {}
+        self._counter = itertools.count()
+        self._buckets: Dict[str, TokenBucket] = {}
+        # Token'ı bitmiş site: görselleri heap yerine sitenin kuyruğunda bekler,
+        # site bir kez (sıradaki token / backoff bitişi zamanıyla) _ready'ye girer
+        self._parked: Dict[str, deque] = {}
+        self._ready: List[Tuple[float, int, str]] = []
+        self._wakeup = asyncio.Event()
+        self._in_flight = 0
+        self._done: deque = deque()
+        self.checked_total = 0
+
+    # ---------- kuyruk ----------
+    def due_at(self, img: dict) -> float:
+        last = img.get("lastCheckedAt")
+        if not last:
+            return 0.0
+        if is_transient_status(img.get("healthStatus")):
+            return last + self.retry_interval
+        if img.get("isFavorite"):
+            return last + self.favorite_interval
+        return last + self.interval
+
+    @staticmethod
+    def eligible(img: dict) -> bool:
+        return HealthChecker.needs_check(img) and not img.get("isDeleted")
+
+    def schedule(self, img: dict, due: Optional[float] = None):
+        if not self.eligible(img):
+            return
+        due = self.due_at(img) if due is None else due
+        # Boş heap'te 60 sn uyuyan ya da daha geç bir işi bekleyen döngüyü uyandır
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()
+        # Aynı görselin eski girdisi heap'te kalır, pop sırasında atlanır
+        self._queued[img["id"]] = due
+        heapq.heappush(self._heap, (due, next(self._counter), img["id"]))
+
+    def build(self):
+        self._queued = {
+            img["id"]: self.due_at(img)
+            for img in self.store.all() if self.eligible(img)
+        }
+        self._heap = [(due, next(self._counter), img_id) for img_id, due in self._queued.items()]
+        heapq.heapify(self._heap)
+
+    def bucket_key(self, img: dict) -> str:
+        # Eklentinin gönderdiği "site" alanı aynı platformun farklı CDN
+        # host'larını tek limitte toplar (ör. scontent-*.cdninstagram.com)
+        return (img.get("site") or host_of(img["originalUrl"])).lower()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    # ---------- çalışma döngüsü ----------
+    async def _sleep(self, seconds: float):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=min(seconds, 60))
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        self.build()
+        print(f"🗓️ Yeniden doğrulama zamanlayıcısı başladı ({len(self._heap)} görsel)")
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        async with self.checker.client() as client:
+            while True:
+                # Büyük birikimde de her adımda loop'a sıra ver
+                await asyncio.sleep(0)
+                now = time.time()
+
+                if self._ready and self._ready[0][0] <= now:
+                    _, _, key = heapq.heappop(self._ready)
+                    img = self._unpark(key, now)
+                else:
+                    img = await self._pop_due(now)
+                if img is None:
+                    continue
+
+                await slots.acquire()
+                task = asyncio.create_task(self._check(client, img, self._bucket(self.bucket_key(img)), slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+    def _current(self, img_id: str, due: float, now: float) -> Optional[dict]:
+        # Kuyruktaki girdi eskimiş olabilir: güncel kayda göre karar ver
+        if self._queued.get(img_id) != due:
+            return None
+        del self._queued[img_id]
+        img = self.store.get_by_id(img_id)
+        if not img or not self.eligible(img):
+            return None
+        real_due = self.due_at(img)
+        if real_due > now:
+            self.schedule(img, real_due)
+            return None
+        return img
+
+    async def _pop_due(self, now: float) -> Optional[dict]:
+        if not self._heap or self._heap[0][0] > now:
+            nexts = [q[0][0] for q in (self._heap, self._ready) if q]
+            await self._sleep(min(nexts) - now if nexts else 60)
+            return None
+        due, _, img_id = heapq.heappop(self._heap)
+        img = self._current(img_id, due, now)
+        if img is None:
+            return None
+
+        key = self.bucket_key(img)
+        parked = self._parked.get(key)
+        if parked is not None:
+            # Site zaten token bekliyor: sıraya ekle, token harcama
+            parked.append((img_id, due))
+            self._queued[img_id] = due
+            return None
+        wait = self._bucket(key).take()
+        if wait > 0:
+            self._parked[key] = deque([(img_id, due)])
+            self._queued[img_id] = due
+            heapq.heappush(self._ready, (now + wait, next(self._counter), key))
+            return None
+        return img
+
+    def _unpark(self, key: str, now: float) -> Optional[dict]:
+        parked = self._parked[key]
+        while parked and self._queued.get(parked[0][0]) != parked[0][1]:
+            # Bu arada yeniden zamanlanmış / silinmiş
+            parked.popleft()
+        if not parked:
+            del self._parked[key]
+            return None
+
+        wait = self._bucket(key).take()
+        if wait > 0:
+            heapq.heappush(self._ready, (now + wait, next(self._counter), key))
+            return None
+        img_id, due = parked.popleft()
+        if parked:
+            heapq.heappush(self._ready, (now, next(self._counter), key))
+        else:
+            del self._parked[key]
+        img = self._current(img_id, due, now)
+        if img is None:
+            # Token harcandı ama görsel artık gerekmiyor: sıradakine geç
+            self._bucket(key).tokens += 1
+        return img
+
+    async def _check(self, client: httpx.AsyncClient, img: dict, bucket: TokenBucket, slots: asyncio.Semaphore):
+        self._in_flight += 1
+        try:
+            status = await self.checker.check_image(client, img)
+            if is_transient_status(status):
+                bucket.backoff(self.backoff_base, self.backoff_cap)
+            else:
+                bucket.success()
+        finally:
+            self._in_flight -= 1
+            slots.release()
+
+        self.checked_total += 1
+        self._done.append(time.monotonic())
+        updated = self.store.get_by_id(img["id"])
+        if updated:
+            self.schedule(updated)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._done and now - self._done[0] > 60:
+            self._done.popleft()
+        wall = time.time()
+        return {
+            "queued": len(self._queued),
+            "due": sum(1 for due in self._queued.values() if due <= wall),
+            "inFlight": self._in_flight,
+            "checkedTotal": self.checked_total,
+            "checkedLastMinute": len(self._done),
+            "backoff": {
+                key: round(b.blocked_until - now, 1)
+                for key, b in self._buckets.items() if b.blocked_until > now
+            },
+        }
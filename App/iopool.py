@@ -0,0 +1,97 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from metrics import REGISTRY
+
+
+# =====================
+# I/O EXECUTOR
+# =====================
+# Dosya ve SQLite gibi bloklayan işler event loop yerine sınırlı bir thread
+# havuzunda çalışır; havuz dolarsa işler sırada bekler (sınırsız thread yok).
+#
+#   digest = await io_executor.run(hash_file, path)
+#
+T = TypeVar("T")
+
+IO_SECONDS = REGISTRY.histogram("io_seconds", "I/O havuzundaki işlerin çalışma süresi (saniye)")
+IO_WAIT_SECONDS = REGISTRY.histogram("io_wait_seconds", "I/O işinin havuzda sıra bekleme süresi (saniye)")
+LOOP_LAG_SECONDS = REGISTRY.histogram("event_loop_lag_seconds", "Event loop gecikmesi (saniye)")
+LOOP_STALLS = REGISTRY.counter("event_loop_stalls_total", "Gecikme bütçesini aşan event loop duraksamaları")
+
+
+class IOExecutor:
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="morgifile-io")
+        REGISTRY.gauge("io_pending", "I/O havuzunda bekleyen + çalışan işler", fn=lambda: {(): self.pending})
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        name = getattr(fn, "__name__", "call")
+
+        def call():
+            started = time.perf_counter()
+            try:
+                return started, fn(*args, **kwargs), None
+            except BaseException as e:
+                return started, None, e
+
+        # Metrikler yalnızca event loop'ta güncellenir (thread güvenliği)
+        self.pending += 1
+        try:
+            started, result, error = await loop.run_in_executor(self._executor, call)
+        finally:
+            self.pending -= 1
+        finished = time.perf_counter()
+        IO_WAIT_SECONDS.observe(started - submitted, op=name)
+        IO_SECONDS.observe(finished - started, op=name)
+        if error is not None:
+            raise error
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+# =====================
+# EVENT LOOP WATCHDOG
+# =====================
+# Her `interval` saniyede uyanması gereken görevin gecikmesi = loop'u
+# bloklayan en uzun iş. Bütçeyi aşanlar sayılır ve loglanır.
+class LoopWatchdog:
+    def __init__(self, interval: float = 0.05, budget: float = 0.1, log: bool = True):
+        self.interval = interval
+        self.budget = budget
+        self.log = log
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def reset(self):
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            LOOP_LAG_SECONDS.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.budget:
+                self.stalls += 1
+                LOOP_STALLS.inc()
+                if self.log:
+                    print(f"🐢 Event loop {lag * 1000:.0f} ms bloklandı")
+
+    def stats(self) -> dict:
+        return {
+            "budgetMs": round(self.budget * 1000, 1),
+            "maxLagMs": round(self.max_lag * 1000, 3),
+            "stalls": self.stalls,
+        }
@@ -0,0 +1,235 @@
+import time
+import asyncio
+import bisect
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Tuple, Callable, Iterable
+
+
+# =====================
+# METRICS
+# =====================
+# Bağımlılıksız, Prometheus metin formatında (0.0.4) sayaç / gösterge /
+# histogram. Modüller ortak REGISTRY'ye yazar, /metrics onu render eder.
+#
+#   with span("store_flush"): ...
+#
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Saniye cinsinden: 0.5 ms .. 10 sn
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+        for k, v in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, LabelKey, float]]:
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], Dict[LabelKey, float]]] = None):
+        super().__init__(name, help)
+        # fn: değer render anında hesaplanır (bağlantı sayısı gibi)
+        self.fn = fn
+
+    def set(self, value: float, **labels):
+        self.values[_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is not None:
+            for key, value in self.fn().items():
+                yield self.name, key, value
+            return
+        yield from super().samples()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # etiket -> [kova sayaçları..., +Inf, toplam]
+        self.values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        row = self.values.get(key)
+        if row is None:
+            row = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def summary(self, key: LabelKey) -> dict:
+        # Periyodik log için: adet, ortalama ve kovalardan yaklaşık p99
+        row = self.values[key]
+        count = sum(row[:-1])
+        target, seen, p99 = count * 0.99, 0, float("inf")
+        for bound, n in zip((*self.buckets, float("inf")), row[:-1]):
+            seen += n
+            if seen >= target:
+                p99 = bound
+                break
+        return {"count": count, "mean": row[-1] / count if count else 0.0, "p99": p99}
+
+    def samples(self):
+        for key, row in self.values.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), row[:-1]):
+                cumulative += n
+                yield f"{self.name}_bucket", key + (("le", _format_value(float(bound))),), cumulative
+            yield f"{self.name}_sum", key, row[-1]
+            yield f"{self.name}_count", key, cumulative
+
+
+class Registry:
+    def __init__(self, prefix: str = "morgifile_"):
+        self.prefix = prefix
+        self.metrics: Dict[str, object] = {}
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        name = self.prefix + name
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, help, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str, fn=None) -> Gauge:
+        return self._get(Gauge, name, help, fn=fn)
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        # Yapılandırılmış log satırı: sayaç / gösterge değerleri ve histogram özetleri
+        result = {}
+        for metric in self.metrics.values():
+            short = metric.name[len(self.prefix):]
+            if isinstance(metric, Histogram):
+                for key in metric.values:
+                    s = metric.summary(key)
+                    label = ",".join(v for _, v in key)
+                    result[f"{short}[{label}]" if label else short] = {
+                        "count": s["count"],
+                        "mean_ms": round(s["mean"] * 1000, 3),
+                        "p99_ms": s["p99"] * 1000 if s["p99"] != float("inf") else None,
+                    }
+            else:
+                for _, key, value in metric.samples():
+                    label = ",".join(v for _, v in key)
+                    result[f"{short}[{label}]" if label else short] = value
+        return result
+
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.histogram("span_seconds", "Sıcak yol süreleri (saniye)")
+LOCK_WAIT_SECONDS = REGISTRY.histogram("lock_wait_seconds", "Kilidi almak için beklenen süre (saniye)")
+LOCK_HOLD_SECONDS = REGISTRY.histogram("lock_hold_seconds", "Kilidin tutulduğu süre (saniye)")
+LOCK_WAITERS = REGISTRY.gauge("lock_waiters", "Kilidi bekleyen görev sayısı")
+
+
+def span(name: str):
+    return SPAN_SECONDS.time(span=name)
+
+
+class TimedLock:
+    # asyncio.Lock ile aynı kullanım; bekleme ve tutma süreleri ölçülür
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = asyncio.Lock()
+        self._acquired_at = 0.0
+        LOCK_WAITERS.set(0, lock=name)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    async def __aenter__(self):
+        started = time.perf_counter()
+        LOCK_WAITERS.inc(lock=self.name)
+        try:
+            await self._lock.acquire()
+        finally:
+            LOCK_WAITERS.dec(lock=self.name)
+        self._acquired_at = time.perf_counter()
+        LOCK_WAIT_SECONDS.observe(self._acquired_at - started, lock=self.name)
+        return self
+
+    async def __aexit__(self, *exc):
+        LOCK_HOLD_SECONDS.observe(time.perf_counter() - self._acquired_at, lock=self.name)
+        self._lock.release()
+
+
+UPSTREAM_REQUESTS = REGISTRY.counter("upstream_requests_total", "Kaynak sunuculara giden istekler")
+UPSTREAM_SECONDS = REGISTRY.histogram("upstream_seconds", "Kaynak yanıt başlıklarına kadar geçen süre (saniye)")
+
+
+def upstream_hooks(client: str) -> Dict[str, list]:
+    # httpx event hook'ları: her kaynak isteği istemci / durum koduna göre sayılır
+    async def on_request(request):
+        request.extensions["metrics_started"] = time.perf_counter()
+
+    async def on_response(response):
+        started = response.request.extensions.get("metrics_started")
+        if started is not None:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, client=client)
+        UPSTREAM_REQUESTS.inc(client=client, method=response.request.method, status=response.status_code)
+
+    return {"request": [on_request], "response": [on_response]}
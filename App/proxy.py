@@ -0,0 +1,522 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import weakref
+from collections import OrderedDict
+from typing import Optional, Dict, List, AsyncIterator, Tuple
+
+import httpx
+
+from iopool import IOExecutor
+
+try:
+    import h2  # noqa: F401  (httpx[http2] kuruluysa HTTP/2 kullan)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+# =====================
+# IMAGE PROXY
+# =====================
+UPSTREAM_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/121.0.0.0 Safari/537.36"
+    ),
+    "Referer": "https://www.instagram.com/",
+    "Accept": "image/avif,image/webp,image/apng,image/*,*/*;q=0.8",
+}
+
+# Tarayıcıdan kaynağa aktarılan koşullu / aralık başlıkları
+FORWARD_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+
+# Kaynaktan tarayıcıya aktarılan başlıklar
+FORWARD_RESPONSE_HEADERS = (
+    "content-type", "content-length", "content-encoding", "content-range",
+    "accept-ranges", "etag", "last-modified",
+)
+
+PASS_STATUSES = (200, 206, 304)
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code: int, detail: str = "Image fetch failed"):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# =====================
+# DISK CACHE
+# =====================
+# URL'in SHA-256 özetiyle adlandırılan dosyalar: "<key>.bin" gövde,
+# "<key>.json" içerik tipi / ETag / Last-Modified. Toplam boyut sınırı
+# aşılınca en uzun süredir kullanılmayanlar silinir (LRU).
+class CacheWriter:
+    # Parçalar bellekte biriktirilir, diske I/O havuzunda toplu yazılır
+    BUFFER_BYTES = 256 * 1024
+
+    def __init__(self, cache: "ProxyCache", url: str, headers: Dict[str, str]):
+        self.cache = cache
+        self.url = url
+        self.key = cache.key(url)
+        self.headers = headers
+        self.tmp_path = os.path.join(cache.root, f"{self.key}.{uuid.uuid4().hex}.tmp")
+        self.size = 0
+        self._file = None
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+
+    async def write(self, chunk: bytes):
+        self._buffer.append(chunk)
+        self._buffered += len(chunk)
+        self.size += len(chunk)
+        if self._buffered >= self.BUFFER_BYTES:
+            chunks, self._buffer, self._buffered = self._buffer, [], 0
+            await self.cache.io(self._write_chunks, chunks)
+
+    async def commit(self):
+        chunks, self._buffer, self._buffered = self._buffer, [], 0
+        await self.cache.io(self._finish, chunks)
+        expected = self.headers.get("content-length")
+        if expected is not None and int(expected) != self.size:
+            await self.abort()
+            return
+        await self.cache.commit(self)
+
+    async def abort(self):
+        self._buffer, self._buffered = [], 0
+        await self.cache.io(self._discard)
+
+    # ---------- I/O havuzunda ----------
+    def _write_chunks(self, chunks: List[bytes]):
+        if self._file is None:
+            self._file = open(self.tmp_path, "wb")
+        self._file.writelines(chunks)
+
+    def _finish(self, chunks: List[bytes]):
+        self._write_chunks(chunks)
+        self._file.close()
+
+    def _discard(self):
+        if self._file is not None:
+            self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class ProxyCache:
+    def __init__(self, root: str, executor: IOExecutor, max_bytes: int = 512 * 1024 * 1024, max_age: float = 86400):
+        self.root = root
+        # Dosya işlemleri event loop dışında, paylaşılan I/O havuzunda
+        self.io = executor.run
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale": 0, "evictions": 0}
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def data_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.bin")
+
+    def meta_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def load(self):
+        metas = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".tmp"):
+                # Yarım kalmış yazımlar
+                os.remove(path)
+                continue
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if os.path.getsize(self.data_path(meta["key"])) != meta["size"]:
+                    raise ValueError("boyut uyuşmuyor")
+            except (OSError, ValueError, KeyError):
+                self._remove_files(name[:-5])
+                continue
+            metas.append(meta)
+
+        for meta in sorted(metas, key=lambda m: m.get("fetchedAt", 0)):
+            self.entries[meta["key"]] = meta
+            self.total_bytes += meta["size"]
+        for key in self._evict():
+            self._remove_files(key)
+        print(f"🗄️ Proxy önbelleği: {len(self.entries)} görsel, {self.total_bytes // (1024 * 1024)} MB")
+
+    def lookup(self, url: str) -> Optional[dict]:
+        meta = self.entries.get(self.key(url))
+        if meta is not None:
+            self.entries.move_to_end(meta["key"])
+        return meta
+
+    def is_fresh(self, meta: dict) -> bool:
+        return time.time() - meta["fetchedAt"] < self.max_age
+
+    def open_writer(self, url: str, headers: Dict[str, str]) -> CacheWriter:
+        return CacheWriter(self, url, headers)
+
+    async def commit(self, writer: CacheWriter):
+        meta = {
+            "key": writer.key,
+            "url": writer.url,
+            "size": writer.size,
+            "fetchedAt": time.time(),
+            "headers": {k: v for k, v in writer.headers.items() if k != "content-length"},
+        }
+        old = self.entries.pop(writer.key, None)
+        if old is not None:
+            self.total_bytes -= old["size"]
+        await self.io(self._store, writer.tmp_path, meta)
+        self.entries[writer.key] = meta
+        self.total_bytes += meta["size"]
+        evicted = self._evict()
+        if evicted:
+            await self.io(self._remove_many, evicted)
+
+    async def refresh(self, meta: dict, headers: Dict[str, str]):
+        # 304 sonrası: gövde aynı, sadece tazelik ve doğrulayıcılar güncellenir
+        meta["fetchedAt"] = time.time()
+        for name in ("etag", "last-modified"):
+            if name in headers:
+                meta["headers"][name] = headers[name]
+        await self.io(self._write_meta, {**meta, "headers": dict(meta["headers"])})
+
+    def _store(self, tmp_path: str, meta: dict):
+        os.replace(tmp_path, self.data_path(meta["key"]))
+        self._write_meta(meta)
+
+    def _write_meta(self, meta: dict):
+        tmp = self.meta_path(meta["key"]) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, self.meta_path(meta["key"]))
+
+    def _evict(self) -> List[str]:
+        # Sayaçlar loop'ta güncellenir; dönen anahtarların dosyaları çağıran tarafından silinir
+        evicted = []
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, meta = self.entries.popitem(last=False)
+            self.total_bytes -= meta["size"]
+            self.stats["evictions"] += 1
+            evicted.append(key)
+        return evicted
+
+    def _remove_many(self, keys: List[str]):
+        for key in keys:
+            self._remove_files(key)
+
+    def _remove_files(self, key: str):
+        for path in (self.data_path(key), self.meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def iter_file(self, key: str, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        f = await self.io(open, self.data_path(key), "rb")
+        try:
+            while True:
+                chunk = await self.io(f.read, chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        finally:
+            await self.io(f.close)
+
+    def metrics(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "maxBytes": self.max_bytes,
+            "hitRatio": round(self.stats["hits"] / lookups, 3) if lookups else None,
+        }
+
+
+class _Subscriber:
+    def __init__(self, max_chunks: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_chunks)
+        self.closed = False
+
+
+class _Flight:
+    # Aynı URL için eşzamanlı isteklerin paylaştığı tek kaynak isteği
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.joinable = True
+        self.status = 0
+        self.headers: Dict[str, str] = {}
+        self.error: Optional[BaseException] = None
+        self.subscribers: List[_Subscriber] = []
+
+
+class ImageProxy:
+    def __init__(
+        self,
+        cache: Optional[ProxyCache] = None,
+        timeout: float = 20,
+        max_connections: int = 64,
+        max_chunks: int = 16,
+        event_hooks: Optional[Dict[str, list]] = None,
+    ):
+        self.cache = cache
+        self.event_hooks = event_hooks
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_chunks = max_chunks
+        self._client: Optional[httpx.AsyncClient] = None
+        self._flights: Dict[str, _Flight] = {}
+        self._tasks = set()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Tek, uzun ömürlü havuz: her istekte yeni TCP+TLS el sıkışması yok
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2,
+                follow_redirects=True,
+                timeout=self.timeout,
+                headers=UPSTREAM_HEADERS,
+                event_hooks=self.event_hooks,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url: str, request_headers: Dict[str, str]) -> Tuple[int, Dict[str, str], AsyncIterator[bytes]]:
+        forwarded = {k.lower(): v for k, v in request_headers.items() if k.lower() in FORWARD_REQUEST_HEADERS}
+
+        if self.cache is None or "range" in forwarded:
+            if forwarded:
+                # Koşullu / aralık istekleri kişiye özel, birleştirilmez
+                return await self._fetch_direct(url, forwarded)
+            return await self._fetch_shared(url)
+
+        meta = self.cache.lookup(url)
+        if meta is None:
+            self.cache.stats["misses"] += 1
+            status, headers, body = await self._fetch_shared(url)
+            headers["x-cache"] = "MISS"
+            return status, headers, body
+
+        if self.cache.is_fresh(meta):
+            self.cache.stats["hits"] += 1
+            return self._serve_cached(meta, forwarded, "HIT")
+        return await self._revalidate(url, meta, forwarded)
+
+    # ---------- önbellekten ----------
+    def _serve_cached(self, meta: dict, forwarded: Dict[str, str], label: str):
+        headers = dict(meta["headers"])
+        headers["x-cache"] = label
+        etag = headers.get("etag")
+        if etag and etag in forwarded.get("if-none-match", ""):
+            return 304, headers, _empty()
+        headers["content-length"] = str(meta["size"])
+        return 200, headers, self.cache.iter_file(meta["key"])
+
+    async def _revalidate(self, url: str, meta: dict, forwarded: Dict[str, str]):
+        conditional = {}
+        if "etag" in meta["headers"]:
+            conditional["If-None-Match"] = meta["headers"]["etag"]
+        if "last-modified" in meta["headers"]:
+            conditional["If-Modified-Since"] = meta["headers"]["last-modified"]
+
+        try:
+            request = self.client.build_request("GET", url, headers=conditional)
+            resp = await self.client.send(request, stream=True)
+        except httpx.HTTPError:
+            # Kaynağa ulaşılamıyor: eski kopyayı sun
+            self.cache.stats["stale"] += 1
+            return self._serve_cached(meta, forwarded, "STALE")
+
+        if resp.status_code == 304:
+            await resp.aclose()
+            await self.cache.refresh(meta, resp.headers)
+            self.cache.stats["revalidated"] += 1
+            return self._serve_cached(meta, forwarded, "REVALIDATED")
+
+        if resp.status_code != 200:
+            await resp.aclose()
+            self.cache.stats["stale"] += 1
+            return self._serve_cached(meta, forwarded, "STALE")
+
+        self.cache.stats["misses"] += 1
+        headers = _response_headers(resp)
+        writer = self.cache.open_writer(url, headers)
+
+        async def body():
+            try:
+                async for chunk in resp.aiter_raw():
+                    await writer.write(chunk)
+                    yield chunk
+            except BaseException:
+                await writer.abort()
+                raise
+            else:
+                await writer.commit()
+            finally:
+                await resp.aclose()
+
+        headers["x-cache"] = "MISS"
+        return 200, headers, body()
+
+    # ---------- ortak kaynak isteği ----------
+    async def _fetch_shared(self, url: str):
+        flight = self._flights.get(url)
+        if flight is None or not flight.joinable:
+            flight = self._flights[url] = _Flight()
+            sub = self._subscribe(flight)
+            task = asyncio.create_task(self._pump(url, flight))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            sub = self._subscribe(flight)
+
+        try:
+            await flight.ready.wait()
+        except BaseException:
+            # Başlıklar gelmeden istemci koptu: kuyruğu pompayı tıkamasın
+            self._unsubscribe(flight, sub)
+            raise
+        if flight.error is not None:
+            self._unsubscribe(flight, sub)
+            raise flight.error
+        body = self._drain(flight, sub)
+        # Gövde hiç okunmadan bırakılırsa (yanıt gönderilemedi) abonelik de düşer
+        weakref.finalize(body, self._unsubscribe, flight, sub)
+        return flight.status, dict(flight.headers), body
+
+    # ---------- doğrudan akış ----------
+    async def _fetch_direct(self, url: str, headers: Dict[str, str]):
+        request = self.client.build_request("GET", url, headers=headers)
+        resp = await self.client.send(request, stream=True)
+        if resp.status_code not in PASS_STATUSES:
+            await resp.aclose()
+            raise UpstreamError(resp.status_code)
+
+        async def body():
+            try:
+                async for chunk in resp.aiter_raw():
+                    yield chunk
+            finally:
+                await resp.aclose()
+
+        return resp.status_code, _response_headers(resp), body()
+
+    # ---------- birleştirilmiş akış ----------
+    def _subscribe(self, flight: _Flight) -> _Subscriber:
+        sub = _Subscriber(self.max_chunks)
+        flight.subscribers.append(sub)
+        return sub
+
+    @staticmethod
+    def _unsubscribe(flight: _Flight, sub: _Subscriber):
+        sub.closed = True
+        if sub in flight.subscribers:
+            flight.subscribers.remove(sub)
+        # Pompa bu kuyruğa yazarken bekliyorsa serbest bırak
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+
+    async def _drain(self, flight: _Flight, sub: _Subscriber) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await sub.queue.get()
+                if chunk is None:
+                    return
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield chunk
+        finally:
+            self._unsubscribe(flight, sub)
+
+    async def _pump(self, url: str, flight: _Flight):
+        writer: Optional[CacheWriter] = None
+        try:
+            async with self.client.stream("GET", url) as resp:
+                flight.status = resp.status_code
+                flight.headers = _response_headers(resp)
+                if resp.status_code not in PASS_STATUSES:
+                    raise UpstreamError(resp.status_code)
+
+                # Başlıklar geldi: bundan sonra gelen istekler yeni akış açar
+                flight.joinable = False
+                self._flights.pop(url, None)
+                flight.ready.set()
+
+                if self.cache is not None and resp.status_code == 200:
+                    writer = self.cache.open_writer(url, flight.headers)
+
+                async for chunk in resp.aiter_raw():
+                    if not flight.subscribers:
+                        return
+                    if writer:
+                        await writer.write(chunk)
+                    for sub in list(flight.subscribers):
+                        if sub.closed:
+                            continue
+                        # Yavaş istemci kuyruğu dolarsa akış onu bekler (bellek sınırlı),
+                        # hiç okumayan istemci ise zaman aşımında bırakılır
+                        try:
+                            await asyncio.wait_for(sub.queue.put(chunk), self.timeout)
+                        except asyncio.TimeoutError:
+                            self._unsubscribe(flight, sub)
+
+                if writer:
+                    await writer.commit()
+                    writer = None
+        except Exception as e:
+            if not flight.ready.is_set():
+                flight.error = e
+            else:
+                print(f"⚠️ Proxy akışı yarıda kesildi ({url}): {e}")
+                for sub in list(flight.subscribers):
+                    if not sub.closed:
+                        await sub.queue.put(e)
+        finally:
+            if writer:
+                # Akış tamamlanmadı: yarım dosyayı önbelleğe alma
+                await writer.abort()
+            flight.joinable = False
+            if self._flights.get(url) is flight:
+                del self._flights[url]
+            flight.ready.set()
+            for sub in list(flight.subscribers):
+                if not sub.closed:
+                    await sub.queue.put(None)
+
+
+async def _empty() -> AsyncIterator[bytes]:
+    return
+    yield
+
+
+def _response_headers(resp: httpx.Response) -> Dict[str, str]:
+    return {k: resp.headers[k] for k in FORWARD_RESPONSE_HEADERS if k in resp.headers}
@@ -0,0 +1,247 @@
+import re
+import bisect
+import urllib.parse
+from collections import Counter
+from typing import Optional, Dict, List, Iterable, Set, Tuple
+
+
+# =====================
+# SEARCH INDEX
+# =====================
+# Ters indeks: token -> görsel id'leri. Store'a listener olarak bağlanır,
+# her ekleme / güncelleme / silmede yalnızca o kaydın token'ları güncellenir.
+TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+TEXT_FIELDS = ("category", "site", "notes")
+FLAG_FIELDS = ("isFavorite", "isDead", "isSafe", "isCORS")
+FACETS = ("category", "site", "flags")
+
+# "is:favorite" gibi sorgu bayrakları
+QUERY_FLAGS = {
+    "favorite": "isFavorite",
+    "dead": "isDead",
+    "safe": "isSafe",
+    "cors": "isCORS",
+    "deleted": "isDeleted",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    # İmza / hash gibi uzun anlamsız parçalar indekse girmez
+    return [t for t in TOKEN_RE.findall(text.casefold()) if len(t) <= 32]
+
+
+def record_tokens(record: dict) -> Set[str]:
+    tokens: Set[str] = set()
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if isinstance(value, str):
+            tokens.update(tokenize(value))
+    for tag in record.get("tags") or ():
+        if isinstance(tag, str):
+            tokens.update(tokenize(tag))
+
+    url = record.get("originalUrl") or ""
+    parts = urllib.parse.urlsplit(url)
+    tokens.update(tokenize(parts.hostname or ""))
+    tokens.update(tokenize(parts.path))
+    return tokens
+
+
+class FacetCounter:
+    # Çöpte olmayan görseller için kategori / site / bayrak sayaçları
+    fields = frozenset(("category", "site", "isDeleted", *FLAG_FIELDS))
+
+    def __init__(self):
+        self.category: Counter = Counter()
+        self.site: Counter = Counter()
+        self.flags: Counter = Counter()
+
+    @staticmethod
+    def bump(counter: Counter, key, delta: int):
+        # Sıfıra inen anahtar silinir: yeniden adlandırılan kategoriler birikmez
+        counter[key] += delta
+        if not counter[key]:
+            del counter[key]
+
+    def update(self, record: dict, delta: int, live_only: bool = True):
+        if record.get("isDeleted"):
+            self.bump(self.flags, "isDeleted", delta)
+            if live_only:
+                return
+        self.bump(self.category, record.get("category"), delta)
+        self.bump(self.site, record.get("site"), delta)
+        for flag in FLAG_FIELDS:
+            if record.get(flag):
+                self.bump(self.flags, flag, delta)
+
+    def to_dict(self, names: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        result = {}
+        for name in names:
+            counter: Counter = getattr(self, name)
+            result[name] = {k: v for k, v in counter.most_common() if v > 0 and k is not None}
+        return result
+
+
+def _matches(record: dict, filters: Dict[str, object]) -> bool:
+    return all(
+        bool(record.get(k)) == v if isinstance(v, bool)
+        else str(record.get(k, "")).casefold() == str(v).casefold()
+        for k, v in filters.items()
+    )
+
+
+class SearchIndex:
+    # Store yalnızca bu alanlardan biri değişince remove/add çağırır
+    fields = frozenset((*TEXT_FIELDS, "tags", "originalUrl", *FacetCounter.fields))
+
+    def __init__(self, store):
+        self.store = store
+        self.postings: Dict[str, Dict[str, None]] = {}
+        self._tokens_of: Dict[str, Tuple[str, ...]] = {}
+        # Sıralı token listesi (önek araması); token eklenip silindikçe yerinde güncellenir
+        self._vocab: List[str] = []
+        self.facets = FacetCounter()
+
+    # ---------- store listener ----------
+    def add(self, record: dict):
+        img_id = record["id"]
+        tokens = tuple(record_tokens(record))
+        self._tokens_of[img_id] = tokens
+        for token in tokens:
+            bucket = self.postings.get(token)
+            if bucket is None:
+                bucket = self.postings[token] = {}
+                bisect.insort(self._vocab, token)
+            bucket[img_id] = None
+        self.facets.update(record, 1)
+
+    def remove(self, record: dict):
+        img_id = record["id"]
+        for token in self._tokens_of.pop(img_id, ()):
+            bucket = self.postings.get(token)
+            if bucket is None:
+                continue
+            bucket.pop(img_id, None)
+            if not bucket:
+                del self.postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+        self.facets.update(record, -1)
+
+    # ---------- sorgu ----------
+    def _prefix_ids(self, term: str) -> Set[str]:
+        # Terimle başlayan tüm token'ların birleşimi ("pin" -> pinimg, pinterest)
+        ids: Set[str] = set()
+        start = bisect.bisect_left(self._vocab, term)
+        for token in self._vocab[start:]:
+            if not token.startswith(term):
+                break
+            ids.update(self.postings[token])
+        return ids
+
+    @staticmethod
+    def parse(q: str) -> Tuple[List[str], Dict[str, object]]:
+        terms: List[str] = []
+        filters: Dict[str, object] = {}
+        for word in (q or "").split():
+            field, sep, value = word.partition(":")
+            if sep and field == "is" and value.casefold() in QUERY_FLAGS:
+                filters[QUERY_FLAGS[value.casefold()]] = True
+            elif sep and field in ("category", "site") and value:
+                filters[field] = value
+            else:
+                terms.extend(tokenize(word))
+        return terms, filters
+
+    def search(
+        self,
+        q: str = "",
+        cursor: Optional[int] = None,
+        limit: int = 50,
+        facets: Iterable[str] = (),
+    ) -> dict:
+        terms, filters = self.parse(q)
+        filters.setdefault("isDeleted", False)
+        facets = [f for f in facets if f in FACETS]
+
+        # Aday küme: en seçici terimden başlayarak kesişim
+        candidates: Optional[Set[str]] = None
+        for ids in sorted((self._prefix_ids(t) for t in terms), key=len):
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                break
+        if candidates is None:
+            bucket = self.store.by_category.get(filters.get("category"))
+            if bucket is not None and len(bucket) * 8 < self.store.count():
+                candidates = set(bucket)
+
+        # En yeni önce; cursor = son dönen kaydın seq değeri. Tüm eşleşmeler
+        # sıralanmaz: küçük aday küme sıralanır, büyükse store sırasında yürünür
+        if candidates is None:
+            ordered = self.store.iter_newest(cursor)
+        elif len(candidates) * 8 >= self.store.count():
+            ordered = ((seq, r) for seq, r in self.store.iter_newest(cursor) if r["id"] in candidates)
+        else:
+            seqs = sorted(
+                (
+                    (seq, i) for seq, i in ((self.store.seq_of(i), i) for i in candidates if i in self.store.by_id)
+                    if cursor is None or seq < cursor
+                ),
+                reverse=True,
+            )
+            ordered = ((seq, self.store.get_by_id(i)) for seq, i in seqs)
+
+        page: List[dict] = []
+        next_cursor = None
+        for seq, record in ordered:
+            if not _matches(record, filters):
+                continue
+            if len(page) == limit:
+                next_cursor = self.store.seq_of(page[-1]["id"])
+                break
+            page.append(record)
+
+        matches: Optional[List[dict]] = None
+        total = self._counted_total(terms, filters)
+        if total is None or (facets and not self._unfiltered(terms, filters)):
+            pool = self.store.all() if candidates is None else (
+                self.store.get_by_id(i) for i in candidates
+            )
+            matches = [r for r in pool if r is not None and _matches(r, filters)]
+            total = len(matches)
+
+        result = {"total": total, "items": page, "nextCursor": next_cursor}
+        if facets:
+            if matches is None:
+                # Filtresiz: sürekli güncel tutulan sayaçlar, O(1)
+                result["facets"] = self.facets.to_dict(facets)
+            else:
+                counter = FacetCounter()
+                for record in matches:
+                    counter.update(record, 1, live_only=False)
+                result["facets"] = counter.to_dict(facets)
+        return result
+
+    @staticmethod
+    def _unfiltered(terms: List[str], filters: Dict[str, object]) -> bool:
+        return not terms and filters == {"isDeleted": False}
+
+    def _counted_total(self, terms: List[str], filters: Dict[str, object]) -> Optional[int]:
+        # Tek alanlı filtrelerde toplam, facet sayaçlarından (tarama yok)
+        if terms:
+            return None
+        rest = dict(filters)
+        deleted = rest.pop("isDeleted")
+        if deleted:
+            return self.facets.flags["isDeleted"] if not rest else None
+        if not rest:
+            return self.store.count() - self.facets.flags["isDeleted"]
+        if len(rest) > 1:
+            return None
+        (field, value), = rest.items()
+        if field in FLAG_FIELDS:
+            return self.facets.flags[field]
+        if field == "category" and value in self.store.by_category:
+            # Sayaç anahtarı birebir; filtre büyük/küçük harf duyarsız
+            if sum(1 for name in self.facets.category if str(name).casefold() == str(value).casefold()) == 1:
+                return self.facets.category[value]
+        return None
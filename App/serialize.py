@@ -0,0 +1,62 @@
+import json
+from typing import Any, Optional, Callable
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# =====================
+# FAST JSON
+# =====================
+# orjson kuruluysa onu, değilse stdlib json'u kullanır. Çıktı her iki
+# durumda da kompakt (boşluksuz) UTF-8; diskte ve ağda aynı format.
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, option=_OPTIONS)
+
+    def dumps_str(obj: Any) -> str:
+        return orjson.dumps(obj, option=_OPTIONS).decode("utf-8")
+
+    # str ve bytes kabul eder
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def dumps_str(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class EncodedCache:
+    # Pahalı bir gövdenin kodlanmış hali; sürüm (ör. store.revision) değişince
+    # ilk istekte yeniden üretilir, arada gelen istekler aynı bytes'ı paylaşır
+    def __init__(self, build: Callable[[], Any], version: Callable[[], Any]):
+        self.build = build
+        self.version = version
+        self._version: Optional[Any] = None
+        self._body: Optional[bytes] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> bytes:
+        current = self.version()
+        if self._body is None or self._version != current:
+            self._body = dumps(self.build())
+            self._version = current
+            self.misses += 1
+        else:
+            self.hits += 1
+        return self._body
@@ -0,0 +1,391 @@
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import hashlib
+import urllib.parse
+from collections import Counter
+from typing import Optional, Dict, List, Callable, Awaitable, Iterable, Tuple
+
+import httpx
+
+from health import host_of
+from iopool import IOExecutor
+
+
+# =====================
+# BULK SHIELD
+# =====================
+# Görselleri tarayıcıya indirtmek yerine sunucu kendisi indirir ve
+# SAFE_STORAGE'a yazar; linkler ölmeden büyük arşivi korumak için.
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/avif": ".avif",
+}
+
+
+class ShieldError(Exception):
+    pass
+
+
+def guess_extension(url: str, content_type: str) -> str:
+    ext = CONTENT_TYPE_EXTENSIONS.get(content_type.split(";")[0].strip().lower())
+    if ext:
+        return ext
+    ext = os.path.splitext(urllib.parse.urlsplit(url).path)[1].lower()
+    return ext if ext in CONTENT_TYPE_EXTENSIONS.values() else ".jpg"
+
+
+# =====================
+# SAFE STORAGE
+# =====================
+# Dosyalar içerik özetiyle ("<sha256><ext>") saklanır; aynı görsel farklı
+# CDN URL'lerinden kaydedilse de diskte tek kopya olur. Referans sayısı,
+# store'daki safeHash indeksinden gelir: son görsel silinince dosya silinir.
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SafeStorage:
+    def __init__(self, root: str, store, executor: IOExecutor):
+        self.root = root
+        self.store = store
+        # Dosya işlemleri event loop dışında, paylaşılan I/O havuzunda
+        self.io = executor.run
+        # Diske yazılmış ama henüz store'a işlenmemiş özetler (silinmesin)
+        self._pins: Counter = Counter()
+        # Yer seçimi + taşıma / silme tek adım: aynı dosyayı eşzamanlı silip paylaşmasınlar
+        self._lock = asyncio.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def temp_path(self) -> str:
+        return os.path.join(self.root, f".{uuid.uuid4().hex}.part")
+
+    def path_for(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, f"{digest}{ext}")
+
+    @staticmethod
+    def _place(tmp_path: str, candidates: List[str]) -> str:
+        # Aynı içerik zaten varsa yeni kopyayı at, mevcut dosyayı paylaş
+        for path in candidates:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                return path
+        os.replace(tmp_path, candidates[-1])
+        return candidates[-1]
+
+    async def ingest(self, tmp_path: str, digest: str, ext: str) -> str:
+        candidates = [
+            path for path in (self.store.get_by_id(i).get("SafePath") for i in self.store.safe_refs(digest))
+            if path
+        ]
+        candidates.append(self.path_for(digest, ext))
+        async with self._lock:
+            final_path = await self.io(self._place, tmp_path, candidates)
+            self._pins[digest] += 1
+        return final_path
+
+    async def adopt(self, src_path: str) -> Tuple[str, str]:
+        # Dışarıdaki dosyayı (ör. Downloads) depoya taşı
+        tmp = self.temp_path()
+        await self.io(shutil.move, src_path, tmp)
+        try:
+            digest = await self.io(hash_file, tmp)
+            return digest, await self.ingest(tmp, digest, os.path.splitext(src_path)[1].lower())
+        except BaseException:
+            await self.io(self._remove_quietly, tmp)
+            raise
+
+    @staticmethod
+    def _remove_quietly(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def unpin(self, digest: str):
+        self._pins[digest] -= 1
+        if self._pins[digest] <= 0:
+            del self._pins[digest]
+
+    async def discard(self, digest: str, path: str):
+        # İşlenemeyen (kaydı silinmiş) bir ingest'i geri al
+        self.unpin(digest)
+        await self.release([{"isSafe": True, "SafePath": path, "safeHash": digest}])
+
+    async def release(self, records: Iterable[dict]) -> int:
+        # Store'dan SİLİNDİKTEN sonra çağrılır: referansı kalmayan dosyaları sil
+        async with self._lock:
+            paths = []
+            for img in records:
+                if not img.get("isSafe") or not img.get("SafePath"):
+                    continue
+                digest = img.get("safeHash")
+                # Eski düzen "<id><ext>" (özetsiz): dosya yalnızca bu görsele ait
+                if not digest or not (self.store.safe_refs(digest) or self._pins.get(digest)):
+                    paths.append(img["SafePath"])
+            if not paths:
+                return 0
+            return await self.io(self._unlink_all, paths)
+
+    @classmethod
+    def _unlink_all(cls, paths: List[str]) -> int:
+        return sum(cls._unlink(path) for path in paths)
+
+    @staticmethod
+    def _unlink(path: str) -> int:
+        safe_path = os.path.normpath(path)
+        try:
+            os.remove(safe_path)
+            print(f"🗑️ Diskten silindi: {safe_path}")
+            return 1
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            print(f"⚠️ Dosya silinirken hata ( {safe_path} ): {e}")
+            return 0
+
+    async def migrate(self, on_commit: Optional[Callable[[int], Awaitable[None]]] = None, batch_size: int = 200):
+        # "<id><ext>" adlı eski kalkan dosyalarını özet adına taşı (tekrarlar birleşir)
+        legacy = [
+            img for img in self.store.all()
+            if img.get("isSafe") and img.get("SafePath") and not img.get("safeHash")
+        ]
+        if not legacy:
+            return
+        print(f"🔁 {len(legacy)} kalkan dosyası içerik özetine taşınıyor...")
+
+        for start in range(0, len(legacy), batch_size):
+            updates: Dict[str, dict] = {}
+            for img in legacy[start:start + batch_size]:
+                path = os.path.normpath(img["SafePath"])
+                if not await self.io(os.path.exists, path):
+                    continue
+                try:
+                    digest = await self.io(hash_file, path)
+                    tmp = self.temp_path()
+                    await self.io(os.replace, path, tmp)
+                    new_path = await self.ingest(tmp, digest, os.path.splitext(path)[1].lower())
+                    size = await self.io(os.path.getsize, new_path)
+                except OSError as e:
+                    print(f"⚠️ Kalkan dosyası taşınamadı ( {path} ): {e}")
+                    continue
+                updates[img["id"]] = {"SafePath": new_path, "safeHash": digest, "safeSize": size}
+
+            since = self.store.revision
+            applied = {record["id"] for record in self.store.update_many(updates)}
+            # Taşıma sürerken silinmiş görsellerin yeni dosyalarını bırakma
+            for img_id, fields in updates.items():
+                if img_id in applied:
+                    self.unpin(fields["safeHash"])
+                else:
+                    await self.discard(fields["safeHash"], fields["SafePath"])
+            if applied and on_commit:
+                await on_commit(since)
+
+
+class ShieldJob:
+    def __init__(self, total: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.errors: Dict[str, str] = {}
+        self.running = True
+        self.started_at = time.time()
+
+    def to_dict(self, errors: bool = True) -> dict:
+        data = {
+            "jobId": self.id,
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "running": self.running,
+        }
+        if errors:
+            data["errors"] = self.errors
+        return data
+
+
+class ShieldService:
+    def __init__(
+        self,
+        store,
+        safe: SafeStorage,
+        client: Callable[[], httpx.AsyncClient],
+        cache=None,
+        concurrency: int = 8,
+        per_host: int = 4,
+        batch_size: int = 100,
+        progress_interval: float = 0.5,
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+        on_commit: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        self.store = store
+        self.safe = safe
+        self.client = client
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.on_progress = on_progress
+        self.on_commit = on_commit
+
+        self.jobs: Dict[str, ShieldJob] = {}
+        self._active = set()
+        self._tasks = set()
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    # ---------- hedef seçimi ----------
+    @staticmethod
+    def eligible(img: dict) -> bool:
+        return (
+            not img.get("isSafe")
+            and not img.get("isDead")
+            and not img.get("originalUrl", "").startswith("images/")
+        )
+
+    def targets(self, ids: Optional[List[str]] = None, filters: Optional[dict] = None) -> List[dict]:
+        if ids is not None:
+            images = [img for img in map(self.store.get_by_id, ids) if img]
+        else:
+            filters = dict(filters or {})
+            filters.setdefault("isDeleted", False)
+            images, _ = self.store.list_page(None, max(self.store.count(), 1), filters)
+        return [img for img in images if self.eligible(img) and img["id"] not in self._active]
+
+    # ---------- iş ----------
+    def start(self, images: List[dict]) -> ShieldJob:
+        job = ShieldJob(len(images))
+        self.jobs[job.id] = job
+        self._active.update(img["id"] for img in images)
+        task = asyncio.create_task(self._run(job, images))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: ShieldJob, images: List[dict]):
+        print(f"🛡️ Toplu kalkan başladı ({job.total} görsel)")
+        pending = iter(images)
+        batch: Dict[str, dict] = {}
+        last_report = 0.0
+
+        async def report(force: bool = False):
+            nonlocal last_report
+            now = time.monotonic()
+            if self.on_progress and (force or now - last_report >= self.progress_interval):
+                last_report = now
+                await self.on_progress(job.to_dict(errors=False))
+
+        async def worker(client: httpx.AsyncClient):
+            for img in pending:
+                try:
+                    digest, path, size = await self.download(client, img)
+                    batch[img["id"]] = {
+                        "isSafe": True, "SafePath": path, "safeHash": digest, "safeSize": size,
+                    }
+                    job.done += 1
+                except Exception as e:
+                    job.failed += 1
+                    job.errors[img["id"]] = str(e) or type(e).__name__
+                finally:
+                    self._active.discard(img["id"])
+                if len(batch) >= self.batch_size:
+                    await self._commit(batch)
+                await report()
+
+        try:
+            client = self.client()
+            workers = min(self.concurrency, len(images))
+            await asyncio.gather(*(worker(client) for _ in range(workers)))
+        finally:
+            await self._commit(batch)
+            for img in images:
+                self._active.discard(img["id"])
+            job.running = False
+            await report(force=True)
+        print(f"✅ Toplu kalkan bitti: {job.done} başarılı, {job.failed} hatalı")
+
+    async def _commit(self, batch: Dict[str, dict]):
+        if not batch:
+            return
+        updates = dict(batch)
+        batch.clear()
+
+        # Tek journal kaydı, tek yayın
+        since = self.store.revision
+        applied = {record["id"] for record in self.store.update_many(updates)}
+
+        # İndirme sürerken kalıcı olarak silinmiş görsellerin dosyalarını bırakma
+        for img_id, fields in updates.items():
+            if img_id in applied:
+                self.safe.unpin(fields["safeHash"])
+            else:
+                await self.safe.discard(fields["safeHash"], fields["SafePath"])
+
+        if self.on_commit:
+            await self.on_commit(since)
+
+    # ---------- indirme ----------
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        sem = self._host_limits.get(host)
+        if sem is None:
+            sem = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return sem
+
+    async def download(self, client: httpx.AsyncClient, img: dict) -> Tuple[str, str, int]:
+        url = img["originalUrl"]
+        tmp = self.safe.temp_path()
+        io = self.safe.io
+
+        try:
+            # Proxy önbelleğinde taze kopya varsa ağa hiç çıkma
+            content_type = None
+            meta = self.cache.lookup(url) if self.cache else None
+            if meta is not None and self.cache.is_fresh(meta):
+                try:
+                    await io(shutil.copyfile, self.cache.data_path(meta["key"]), tmp)
+                    digest = await io(hash_file, tmp)
+                    content_type = meta["headers"].get("content-type", "")
+                except OSError:
+                    pass  # bu arada LRU'dan düşmüş olabilir
+
+            if content_type is None:
+                async with self._host_limit(host_of(url)):
+                    async with client.stream("GET", url) as resp:
+                        if resp.status_code != 200:
+                            raise ShieldError(f"HTTP {resp.status_code}")
+                        content_type = resp.headers.get("content-type", "")
+                        if content_type and not content_type.startswith("image/"):
+                            raise ShieldError(f"Görsel değil: {content_type}")
+                        hasher = hashlib.sha256()
+                        f = await io(open, tmp, "wb")
+                        try:
+                            async for chunk in resp.aiter_bytes():
+                                await io(f.write, chunk)
+                                hasher.update(chunk)
+                        finally:
+                            await io(f.close)
+                        digest = hasher.hexdigest()
+
+            # Yarım dosya asla asıl adıyla görünmez; içerik zaten varsa paylaşılır
+            path = await self.safe.ingest(tmp, digest, guess_extension(url, content_type))
+            return digest, path, await io(os.path.getsize, path)
+        except BaseException:
+            await io(self.safe._remove_quietly, tmp)
+            raise
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
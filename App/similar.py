@@ -0,0 +1,258 @@
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# =====================
+# PERCEPTUAL HASH
+# =====================
+def dhash(path: str, size: int = 8) -> str:
+    # Worker process içinde çalışır: 64 bit fark hash'i (16 hex karakter)
+    with Image.open(path) as im:
+        # JPEG'lerde tam çözünürlükte açmadan küçük ölçekli decode
+        im.draft("L", (size * 8, size * 8))
+        im = im.convert("L").resize((size + 1, size), Image.LANCZOS)
+        pixels = list(im.getdata())
+
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return f"{bits:0{size * size // 4}x}"
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    # Hamming uzaklığı için BK-ağacı: küçük yarıçaplı aramada ağacın
+    # yalnızca |d - r| .. d + r aralığındaki dalları gezilir.
+    # Düğüm: [hash, {id: None}, {uzaklık: çocuk düğüm}]
+    def __init__(self):
+        self.root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, item: str):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, {item: None}, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1][item] = None
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, {item: None}, {}]
+                return
+            node = child
+
+    def remove(self, value: int, item: str):
+        # Düğüm yerinde kalır, yalnızca kimlik çıkarılır
+        node = self.root
+        while node is not None:
+            d = hamming(value, node[0])
+            if d == 0:
+                if item in node[1]:
+                    del node[1][item]
+                    self.size -= 1
+                return
+            node = node[2].get(d)
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, str]]:
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            for dist, child in node[2].items():
+                if d - radius <= dist <= d + radius:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+# =====================
+# SIMILARITY INDEX
+# =====================
+class SimilarityIndex:
+    def __init__(
+        self,
+        store,
+        source: Callable[[dict, bool], Awaitable[Optional[str]]],
+        workers: int = 2,
+        concurrency: int = 4,
+        batch_size: int = 100,
+        on_duplicate: Optional[Callable[[dict, List[dict]], Awaitable[None]]] = None,
+        warn_distance: int = 6,
+    ):
+        self.store = store
+        self.source = source
+        self.workers = workers
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.on_duplicate = on_duplicate
+        self.warn_distance = warn_distance
+
+        self.tree = BKTree()
+        self._hash_of: Dict[str, int] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._queued: Dict[str, bool] = {}
+        self._counter = itertools.count()
+        self._pending: Dict[str, dict] = {}
+        self.failed = 0
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    # ---------- indeks ----------
+    def build(self):
+        for img in self.store.all():
+            if img.get("phash"):
+                self._insert(img["id"], img["phash"])
+
+    def _insert(self, img_id: str, phash: str):
+        value = int(phash, 16)
+        old = self._hash_of.get(img_id)
+        if old == value:
+            return
+        if old is not None:
+            self.tree.remove(old, img_id)
+        self._hash_of[img_id] = value
+        self.tree.add(value, img_id)
+
+    def remove(self, img_id: str):
+        value = self._hash_of.pop(img_id, None)
+        if value is not None:
+            self.tree.remove(value, img_id)
+
+    def similar(self, img_id: str, distance: int = 10, limit: int = 50) -> List[dict]:
+        value = self._hash_of.get(img_id)
+        if value is None:
+            return []
+        results = []
+        for d, other in self.tree.search(value, distance):
+            record = self.store.get_by_id(other)
+            if other == img_id or record is None:
+                continue
+            results.append({"id": other, "distance": d})
+            if len(results) == limit:
+                break
+        return results
+
+    # ---------- hesaplama ----------
+    def eligible(self, img: dict) -> bool:
+        if img.get("phash") or img["id"] in self._hash_of:
+            return False
+        return img.get("isSafe") or not img.get("isDead")
+
+    def enqueue(self, img: dict, notify: bool = False):
+        # notify: yeni kaydedilen görsel, önce işlenir ve benzerleri bildirilir
+        if not self.available or not self.eligible(img):
+            return
+        if img["id"] in self._queued and not notify:
+            return
+        self._queued[img["id"]] = notify or self._queued.get(img["id"], False)
+        self._queue.put_nowait((0 if notify else 1, next(self._counter), img["id"]))
+
+    async def compute(self, img: dict, fetch: bool = True) -> Optional[str]:
+        # fetch=False: yalnızca yerel kaynak (kalkan dosyası / proxy önbelleği);
+        # arka plan taraması kaynak sunuculara istek atmaz
+        src = await self.source(img, fetch)
+        if not src:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), dhash, src)
+
+    async def ensure(self, img: dict) -> bool:
+        if img["id"] in self._hash_of:
+            return True
+        if img.get("phash"):
+            self._insert(img["id"], img["phash"])
+            return True
+        try:
+            phash = await self.compute(img)
+        except Exception as e:
+            print(f"⚠️ Algısal hash hesaplanamadı ({img['id']}): {e}")
+            return False
+        if not phash:
+            return False
+        self._insert(img["id"], phash)
+        self.store.update_fields(img["id"], {"phash": phash})
+        return True
+
+    async def run(self):
+        self.build()
+        if not self.available:
+            return
+        for img in self.store.all():
+            self.enqueue(img)
+        print(f"🧬 Benzerlik indeksi: {self.tree.size} hazır, {self._queue.qsize()} kuyrukta")
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+    async def _worker(self):
+        while True:
+            _, _, img_id = await self._queue.get()
+            notify = self._queued.pop(img_id, None)
+            img = self.store.get_by_id(img_id)
+            if notify is None or img is None or not self.eligible(img):
+                continue
+            try:
+                # Yalnızca yeni kayıtlar indirilir; eskiler yerelde yoksa
+                # /similar isteğinde (ensure) hesaplanır
+                phash = await self.compute(img, fetch=notify)
+            except Exception as e:
+                self.failed += 1
+                print(f"⚠️ Algısal hash hesaplanamadı ({img_id}): {e}")
+                continue
+            if not phash:
+                continue
+
+            self._insert(img_id, phash)
+            self._pending[img_id] = {"phash": phash}
+            if len(self._pending) >= self.batch_size or self._queue.empty():
+                self.flush()
+
+            if notify and self.on_duplicate:
+                matches = self.similar(img_id, self.warn_distance, limit=10)
+                if matches:
+                    await self.on_duplicate(img, matches)
+
+    def flush(self):
+        # Hash'ler tek journal kaydıyla yazılır
+        if self._pending:
+            updates, self._pending = self._pending, {}
+            self.store.update_many(updates)
+
+    def stats(self) -> dict:
+        return {
+            "indexed": self.tree.size,
+            "queued": len(self._queued),
+            "failed": self.failed,
+            "available": self.available,
+        }
+
+    def close(self):
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
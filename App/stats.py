@@ -0,0 +1,78 @@
+from collections import Counter
+from typing import Dict
+
+from search import FacetCounter, FLAG_FIELDS
+
+
+# =====================
+# ARCHIVE STATS
+# =====================
+# Store listener'ı: her kayıt değişikliğinde sayaçlar yalnızca o kayıt kadar
+# güncellenir (O(1)); /stats ve kategori kontrolleri arşivi taramaz.
+# Canlı kategori / site / bayrak sayaçları arama facet'leriyle aynı
+# (FacetCounter); üstüne çöp, favori ve Safe dosya sayaçları eklenir.
+class ArchiveStats(FacetCounter):
+    fields = FacetCounter.fields | {"isSafe", "SafePath", "safeHash", "safeSize"}
+
+    def __init__(self):
+        super().__init__()
+        self.total = 0
+        # Kategori başına: tüm kayıtlar / çöptekiler / canlı favoriler
+        self.category_total: Counter = Counter()
+        self.trashed: Counter = Counter()
+        self.favorites: Counter = Counter()
+
+        # Aynı içerik birden çok görselde kullanılabilir: dosya başına bir kez say
+        self.safe_bytes = 0
+        self._safe_refs: Counter = Counter()
+        self._safe_size: Dict[str, int] = {}
+
+    def add(self, record: dict):
+        self.update(record, 1)
+
+    def remove(self, record: dict):
+        self.update(record, -1)
+
+    def update(self, record: dict, delta: int, live_only: bool = True):
+        super().update(record, delta, live_only)
+        self.total += delta
+        name = record.get("category")
+        self.bump(self.category_total, name, delta)
+        if record.get("isDeleted"):
+            self.bump(self.trashed, name, delta)
+        elif record.get("isFavorite"):
+            self.bump(self.favorites, name, delta)
+
+        if record.get("isSafe") and record.get("SafePath"):
+            self._update_safe(record.get("safeHash") or record["SafePath"], record.get("safeSize") or 0, delta)
+
+    def _update_safe(self, key: str, size: int, delta: int):
+        self._safe_refs[key] += delta
+        refs = self._safe_refs[key]
+        if delta > 0 and refs == 1:
+            self._safe_size[key] = size
+            self.safe_bytes += size
+        elif refs <= 0:
+            del self._safe_refs[key]
+            self.safe_bytes -= self._safe_size.pop(key, 0)
+
+    def category_count(self, name: str, live: bool = True) -> int:
+        return self.category[name] if live else self.category_total[name]
+
+    def summary(self) -> dict:
+        return {
+            "total": self.total,
+            "live": self.total - self.flags["isDeleted"],
+            "flags": {flag: self.flags[flag] for flag in (*FLAG_FIELDS, "isDeleted")},
+            "categories": {
+                name: {
+                    "live": self.category[name],
+                    "favorites": self.favorites[name],
+                    "trashed": self.trashed[name],
+                    "total": total,
+                }
+                for name, total in self.category_total.items() if name is not None
+            },
+            "sites": self.to_dict(["site"])["site"],
+            "safe": {"files": len(self._safe_refs), "bytes": self.safe_bytes},
+        }
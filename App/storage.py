@@ -0,0 +1,746 @@
+import os
+import json
+import shutil
+import sqlite3
+import asyncio
+import threading
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from collections import deque
+from typing import Optional, List, Iterable, Iterator, Tuple, Dict
+
+from iopool import IOExecutor
+from metrics import span
+from serialize import dumps_str, loads
+
+
+# =====================
+# SQLITE REPOSITORY
+# =====================
+# Görsel kaydının tamamı "data" kolonunda JSON olarak tutulur,
+# sorgularda kullanılan alanlar ayrıca indeksli kolonlara aynalanır.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    originalUrl TEXT,
+    category TEXT,
+    isDeleted INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_images_url ON images(originalUrl);
+CREATE INDEX IF NOT EXISTS idx_images_category ON images(category, isDeleted);
+
+CREATE TABLE IF NOT EXISTS categories (
+    pos INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _columns(record: dict) -> Tuple:
+    return (
+        record.get("originalUrl"),
+        record.get("category"),
+        1 if record.get("isDeleted") else 0,
+    )
+
+
+def _dump(record: dict) -> str:
+    return dumps_str(record)
+
+
+class ImageRepository:
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # ---------- okuma ----------
+    def rows(self) -> List[Tuple[int, dict]]:
+        with self._lock:
+            rows = self.conn.execute("SELECT seq, data FROM images ORDER BY seq").fetchall()
+        return [(r[0], loads(r[1])) for r in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    # ---------- yazma ----------
+    def insert_many(self, records: Iterable[dict]):
+        rows = [(r["id"], *_columns(r), _dump(r)) for r in records]
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO images (id, originalUrl, category, isDeleted, data) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def apply(self, upserts: List[Tuple[int, dict]], deletes: Iterable[str], revision: Optional[int] = None):
+        # Write-behind flush: tüm birikmiş değişiklikler tek transaction'da
+        rows = [(seq, r["id"], *_columns(r), _dump(r)) for seq, r in upserts]
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO images (seq, id, originalUrl, category, isDeleted, data) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET originalUrl = excluded.originalUrl, category = excluded.category, "
+                "isDeleted = excluded.isDeleted, data = excluded.data",
+                rows,
+            )
+            self.conn.executemany("DELETE FROM images WHERE id = ?", [(i,) for i in deletes])
+            if revision is not None:
+                self.set_meta("revision", str(revision))
+
+    # ---------- kategoriler ----------
+    def list_categories(self) -> List[dict]:
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM categories ORDER BY pos").fetchall()
+        return [loads(r[0]) for r in rows]
+
+    def replace_categories(self, categories: List[dict]):
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM categories")
+            self.conn.executemany(
+                "INSERT INTO categories (name, data) VALUES (?, ?)",
+                [(c["name"], _dump(c)) for c in categories],
+            )
+
+    # ---------- meta ----------
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+
+# =====================
+# OPERATION JOURNAL
+# =====================
+# Append-only JSONL değişiklik günlüğü. Compaction sırasında aktif dosya
+# ".1" uzantısına döndürülür, snapshot yazıldıktan sonra silinir; açılışta
+# önce ".1" sonra aktif dosya oynatılır.
+class OperationJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self.rotated_path = path + ".1"
+        self._file = None
+        self._size = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, op: dict):
+        self.append_many([op])
+
+    def append_many(self, ops: List[dict]):
+        # Toplu işlemlerde tüm satırlar tek write + flush ile.
+        # Bilerek I/O havuzuna taşınmaz: store değişiklikleri senkron ve journal
+        # satırı değişiklik görünür olmadan önce sırayla yazılmalı. fsync yok;
+        # write + flush yalnızca işletim sistemi önbelleğine kopyalar (mikrosaniyeler)
+        with span("journal_append"):
+            data = "".join(dumps_str(op) + "\n" for op in ops)
+            f = self._open()
+            f.write(data)
+            f.flush()
+        self._size += len(data)
+
+    def size(self) -> int:
+        return self._size
+
+    def replay(self):
+        for path in (self.rotated_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield loads(line)
+                    except json.JSONDecodeError:
+                        # Çökme anında yarım kalmış son satır
+                        print(f"⚠️ Journal'da bozuk satır atlandı: {path}")
+
+    def rotate(self):
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.rotated_path):
+            # Önceki compaction başarısız olmuş: sırayı koruyarak birleştir
+            with open(self.path, "r", encoding="utf-8") as src, \
+                    open(self.rotated_path, "a", encoding="utf-8") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.rotated_path)
+        self._size = 0
+
+    def discard_rotated(self):
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# =====================
+# IN-MEMORY STORE
+# =====================
+def _matches(record: dict, filters: dict) -> bool:
+    for key, value in filters.items():
+        current = record.get(key)
+        if isinstance(value, bool):
+            current = bool(current)
+        if current != value:
+            return False
+    return True
+
+
+# Koleksiyon açılışta bir kez belleğe yüklenir; id, originalUrl ve kategori
+# aramaları dict indeksleri üzerinden O(1). Değişiklikler journal'a eklenir,
+# kirli olarak işaretlenir ve gecikmeyle tek transaction halinde diske yazılır.
+# Dönen kayıtlar store'un kendi nesneleridir, çağıran taraf değiştirmemeli.
+class ImageStore:
+    def __init__(
+        self,
+        repo: ImageRepository,
+        executor: IOExecutor,
+        journal: Optional["OperationJournal"] = None,
+        flush_delay: float = 0.5,
+        compact_bytes: int = 4 * 1024 * 1024,
+        change_log_size: int = 10000,
+        background_fields: Iterable[str] = (),
+    ):
+        self.repo = repo
+        self.journal = journal
+        # Snapshot yazımı event loop dışında, paylaşılan I/O havuzunda
+        self.executor = executor
+        self.flush_delay = flush_delay
+        self.compact_bytes = compact_bytes
+
+        self.by_id: Dict[str, dict] = {}
+        self.by_url: Dict[str, str] = {}
+        # Site bazlı kanonik URL anahtarı -> id (token / boyut farkından bağımsız)
+        self.by_key: Dict[str, str] = {}
+        self.by_category: Dict[str, Dict[str, None]] = {}
+        # Kalkan dosyasının içerik özeti -> onu kullanan görseller (referans sayımı)
+        self.by_hash: Dict[str, Dict[str, None]] = {}
+        # Ek indeksler (arama, istatistik): her kayıt eklenişi / çıkarılışında
+        # listener.add(record) / listener.remove(record) çağrılır. Listener'ın
+        # `fields` kümesi varsa, yalnızca bu alanları değiştiren güncellemelerde
+        self.listeners: List = []
+
+        # Sıralama: seq değerleri artan sırada, silinenler None (tombstone)
+        self._seq_of: Dict[str, int] = {}
+        self._seqs: List[int] = []
+        self._order: List[Optional[str]] = []
+        self._tombstones = 0
+        self._next_seq = 1
+
+        self._dirty: Dict[str, None] = {}
+        self._removed: Dict[str, None] = {}
+        # Her değişiklikte artar; son op'lar delta senkronizasyonu için tutulur
+        self.revision = 0
+        self.changes: deque = deque(maxlen=change_log_size)
+        # Yalnızca arka plan bakım alanlarını (ör. son kontrol zamanı) yazan op'lar
+        # bunu artırmaz: tam liste önbelleği / ETag bu revision'a bağlı
+        self.background_fields = frozenset(background_fields)
+        self.visible_revision = 0
+
+        # transaction() içindeki op'lar blok sonunda tek write ile journal'a
+        self._tx_depth = 0
+        self._tx_ops: List[dict] = []
+
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flushing = False
+        self._flush_urgent = False
+        self._replaying = False
+
+    def load(self):
+        self.revision = int(self.repo.get_meta("revision") or 0)
+        for seq, record in self.repo.rows():
+            self._append(seq, record)
+
+        # Son snapshot'tan sonraki op'ları uygula, ardından snapshot'a katla
+        if self.journal:
+            self._replaying = True
+            try:
+                replayed = 0
+                for op in self.journal.replay():
+                    self._replay(op)
+                    if op.get("rev", 0) > self.revision:
+                        self.revision = op["rev"]
+                        self.changes.append(op)
+                    replayed += 1
+            finally:
+                self._replaying = False
+            if replayed:
+                print(f"♻️ Journal'dan {replayed} işlem geri yüklendi")
+            # Snapshot yazılamadıysa journal silinmemeli: tek kopya orada
+            if self.flush():
+                # Geriye yalnızca yarım satır kalmışsa sonraki eklemeleri bozmasın
+                self.journal.rotate()
+                self.journal.discard_rotated()
+        self.visible_revision = self.revision
+        print(f"🧠 {len(self.by_id)} görsel belleğe yüklendi")
+
+    # ---------- indeks bakımı ----------
+    def _append(self, seq: int, record: dict):
+        img_id = record["id"]
+        self.by_id[img_id] = record
+        self._seq_of[img_id] = seq
+        self._seqs.append(seq)
+        self._order.append(img_id)
+        self._next_seq = max(self._next_seq, seq + 1)
+        self._index(record)
+
+    def _index(self, record: dict, listeners: Optional[List] = None):
+        url = record.get("originalUrl")
+        if url:
+            self.by_url.setdefault(url, record["id"])
+        key = record.get("canonicalKey")
+        if key:
+            self.by_key.setdefault(key, record["id"])
+        self.by_category.setdefault(record.get("category"), {})[record["id"]] = None
+        digest = record.get("safeHash")
+        if digest:
+            self.by_hash.setdefault(digest, {})[record["id"]] = None
+        for listener in self.listeners if listeners is None else listeners:
+            listener.add(record)
+
+    def _unindex(self, record: dict, listeners: Optional[List] = None):
+        url = record.get("originalUrl")
+        if url and self.by_url.get(url) == record["id"]:
+            del self.by_url[url]
+        key = record.get("canonicalKey")
+        if key and self.by_key.get(key) == record["id"]:
+            del self.by_key[key]
+        bucket = self.by_category.get(record.get("category"))
+        if bucket is not None:
+            bucket.pop(record["id"], None)
+            if not bucket:
+                del self.by_category[record.get("category")]
+        refs = self.by_hash.get(record.get("safeHash"))
+        if refs is not None:
+            refs.pop(record["id"], None)
+            if not refs:
+                del self.by_hash[record["safeHash"]]
+        for listener in self.listeners if listeners is None else listeners:
+            listener.remove(record)
+
+    def seq_of(self, img_id: str) -> int:
+        return self._seq_of[img_id]
+
+    def _sorted(self, ids: Iterable[str]) -> List[dict]:
+        return [self.by_id[i] for i in sorted(ids, key=self._seq_of.__getitem__)]
+
+    # ---------- okuma ----------
+    def get_by_id(self, img_id: str) -> Optional[dict]:
+        return self.by_id.get(img_id)
+
+    def find_by_url(self, url: str) -> Optional[dict]:
+        img_id = self.by_url.get(url)
+        return self.by_id.get(img_id) if img_id else None
+
+    def find_by_key(self, key: str) -> Optional[dict]:
+        img_id = self.by_key.get(key)
+        return self.by_id.get(img_id) if img_id else None
+
+    def list_by_category(self, category: str, include_deleted: bool = False) -> List[dict]:
+        records = self._sorted(self.by_category.get(category, {}))
+        if include_deleted:
+            return records
+        return [r for r in records if not r.get("isDeleted")]
+
+    def list_deleted(self) -> List[dict]:
+        return [r for r in self.by_id.values() if r.get("isDeleted")]
+
+    def safe_refs(self, digest: str) -> List[str]:
+        return list(self.by_hash.get(digest, ()))
+
+    def list_page(
+        self,
+        after: Optional[int] = None,
+        limit: int = 100,
+        filters: Optional[dict] = None,
+    ) -> Tuple[List[dict], Optional[int]]:
+        # Cursor = son dönen kaydın seq değeri; filtreler alan eşitliği
+        after = after or 0
+        filters = filters or {}
+        if "category" in filters:
+            bucket = self.by_category.get(filters["category"], {})
+            seqs = sorted(self._seq_of[i] for i in bucket)
+            candidates = (
+                (seq, self._order[bisect_right(self._seqs, seq) - 1])
+                for seq in seqs[bisect_right(seqs, after):]
+            )
+        else:
+            start = bisect_right(self._seqs, after)
+            candidates = (
+                (self._seqs[k], self._order[k])
+                for k in range(start, len(self._order)) if self._order[k] is not None
+            )
+
+        page = []
+        last_seq = None
+        for seq, img_id in candidates:
+            record = self.by_id[img_id]
+            if _matches(record, filters):
+                page.append(record)
+                last_seq = seq
+                if len(page) == limit:
+                    break
+        return page, (last_seq if len(page) == limit else None)
+
+    def iter_newest(self, before: Optional[int] = None) -> Iterator[Tuple[int, dict]]:
+        # En yeniden eskiye (seq azalan); before = bu seq'ten küçükler
+        k = bisect_left(self._seqs, before) if before else len(self._seqs)
+        for k in range(k - 1, -1, -1):
+            img_id = self._order[k]
+            if img_id is not None:
+                yield self._seqs[k], self.by_id[img_id]
+
+    def all(self) -> List[dict]:
+        return list(self.by_id.values())
+
+    def count(self) -> int:
+        return len(self.by_id)
+
+    # ---------- yazma ----------
+    # Her değişiklik önce journal'a tek satır olarak eklenir (O(1)),
+    # SQLite snapshot'ı compaction sırasında toplu güncellenir.
+    def insert(self, record: dict):
+        self.insert_many([record])
+
+    def insert_many(self, records: Iterable[dict]):
+        ops = []
+        for record in records:
+            seq = self._next_seq
+            ops.append(self._stamp({"op": "add", "seq": seq, "record": dict(record)}))
+            self._add(seq, record)
+        if not ops:
+            return
+        if self._tx_depth:
+            self._tx_ops.extend(ops)
+        elif self.journal:
+            self.journal.append_many(ops)
+
+    def update_fields(self, img_id: str, fields: dict) -> Optional[dict]:
+        if img_id not in self.by_id:
+            return None
+        self._log(self._patch_op([img_id], fields))
+        return self._patch(img_id, fields)
+
+    def bulk_update(self, ids: Iterable[str], fields: dict) -> int:
+        ids = [i for i in ids if i in self.by_id]
+        if not ids:
+            return 0
+        self._log(self._patch_op(ids, fields))
+        for img_id in ids:
+            self._patch(img_id, fields)
+        return len(ids)
+
+    def update_many(self, updates: Dict[str, dict]) -> List[dict]:
+        # Kayıt başına farklı alanlar, tek journal satırı / tek revision
+        updates = {i: dict(f) for i, f in updates.items() if i in self.by_id}
+        if not updates:
+            return []
+        self._log({"op": "update", "updates": updates})
+        return [self._patch(img_id, fields) for img_id, fields in updates.items()]
+
+    def delete(self, ids: Iterable[str]) -> int:
+        ids = [i for i in ids if i in self.by_id]
+        if not ids:
+            return 0
+        self._log({"op": "delete", "ids": ids})
+        for img_id in ids:
+            self._remove(img_id)
+        self._compact_order()
+        return len(ids)
+
+    @staticmethod
+    def _patch_op(ids: List[str], fields: dict) -> dict:
+        if fields == {"isDeleted": True}:
+            return {"op": "trash", "ids": ids}
+        return {"op": "patch", "ids": ids, "fields": dict(fields)}
+
+    # ---------- bellek üzerinde uygulama (journal'sız) ----------
+    def _add(self, seq: int, record: dict):
+        self._append(seq, record)
+        self._mark(record["id"])
+
+    def _patch(self, img_id: str, fields: dict) -> Optional[dict]:
+        record = self.by_id.get(img_id)
+        if record is None:
+            return None
+        # lastCheckedAt / phash gibi yazımlar arama ve istatistik indekslerine dokunmaz
+        changed = {k for k, v in fields.items() if record.get(k) != v}
+        listeners = [
+            listener for listener in self.listeners
+            if getattr(listener, "fields", None) is None or not changed.isdisjoint(listener.fields)
+        ]
+        self._unindex(record, listeners)
+        record.update(fields)
+        self._index(record, listeners)
+        self._mark(img_id)
+        return record
+
+    def _remove(self, img_id: str):
+        record = self.by_id.pop(img_id, None)
+        if record is None:
+            return
+        self._unindex(record)
+        seq = self._seq_of.pop(img_id)
+        self._order[bisect_right(self._seqs, seq) - 1] = None
+        self._tombstones += 1
+        self._dirty.pop(img_id, None)
+        self._removed[img_id] = None
+        self._schedule_flush()
+
+    def _replay(self, op: dict):
+        kind = op.get("op")
+        if kind == "add":
+            if op["record"]["id"] not in self.by_id:
+                self._add(op["seq"], op["record"])
+        elif kind == "patch":
+            for img_id in op["ids"]:
+                self._patch(img_id, op["fields"])
+        elif kind == "trash":
+            for img_id in op["ids"]:
+                self._patch(img_id, {"isDeleted": True})
+        elif kind == "update":
+            for img_id, fields in op["updates"].items():
+                self._patch(img_id, fields)
+        elif kind == "delete":
+            for img_id in op["ids"]:
+                self._remove(img_id)
+
+    def _compact_order(self):
+        if self._tombstones * 2 < len(self._order):
+            return
+        keep = [(s, i) for s, i in zip(self._seqs, self._order) if i is not None]
+        self._seqs = [s for s, _ in keep]
+        self._order = [i for _, i in keep]
+        self._tombstones = 0
+
+    # ---------- kategoriler (küçük liste, doğrudan SQLite) ----------
+    def list_categories(self) -> List[dict]:
+        return self.repo.list_categories()
+
+    def replace_categories(self, categories: List[dict]):
+        self.repo.replace_categories(categories)
+
+    # ---------- write-behind / compaction ----------
+    def _log(self, op: dict):
+        self._stamp(op)
+        if self._tx_depth:
+            self._tx_ops.append(op)
+        elif self.journal:
+            self.journal.append(op)
+
+    @contextmanager
+    def transaction(self):
+        # Toplu işlemler: blok içinde await yoksa araya başka istek giremez,
+        # tüm op'lar da journal'a tek seferde yazılır
+        self._tx_depth += 1
+        try:
+            yield self
+        finally:
+            self._tx_depth -= 1
+            if not self._tx_depth and self._tx_ops:
+                ops, self._tx_ops = self._tx_ops, []
+                if self.journal:
+                    self.journal.append_many(ops)
+
+    def _stamp(self, op: dict) -> dict:
+        self.revision += 1
+        op["rev"] = self.revision
+        if not self._background(op):
+            self.visible_revision = self.revision
+        self.changes.append(op)
+        return op
+
+    def _background(self, op: dict) -> bool:
+        if op["op"] == "patch":
+            return op["fields"].keys() <= self.background_fields
+        if op["op"] == "update":
+            return all(fields.keys() <= self.background_fields for fields in op["updates"].values())
+        return False
+
+    def changes_since(self, revision: int) -> Optional[List[dict]]:
+        # None: istenen revision artık tutulmuyor, istemci tam yükleme yapmalı
+        if revision >= self.revision:
+            return []
+        oldest = self.changes[0]["rev"] if self.changes else self.revision + 1
+        if revision < oldest - 1:
+            return None
+        return list(islice(self.changes, revision - oldest + 1, None))
+
+    def _mark(self, img_id: str):
+        self._removed.pop(img_id, None)
+        self._dirty[img_id] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._replaying:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Event loop yoksa (başlangıç kodu vb.) hemen yaz
+            self.flush()
+            return
+
+        # Journal eşiği aştıysa compaction'ı beklemeden öne çek
+        urgent = self.journal is not None and self.journal.size() >= self.compact_bytes
+        task = self._flush_task
+        if task is not None and not task.done():
+            # Yazım sürüyorsa, bitince kalan değişiklikler için yeniden planlanır
+            if not urgent or self._flush_urgent or self._flushing:
+                return
+            task.cancel()
+        self._flush_urgent = urgent
+        self._flush_task = loop.create_task(self._delayed_flush(0 if urgent else self.flush_delay))
+
+    async def _delayed_flush(self, delay: float):
+        # Gecikme boyunca gelen tüm değişiklikler tek yazımda birleşir
+        await asyncio.sleep(delay)
+        await self.flush_async()
+        if self._dirty or self._removed:
+            self._flush_task = None
+            self._schedule_flush()
+
+    def _take_pending(self) -> Tuple[List[Tuple[int, dict]], List[str]]:
+        upserts = [(self._seq_of[i], dict(self.by_id[i])) for i in self._dirty]
+        deletes = list(self._removed)
+        self._dirty = {}
+        self._removed = {}
+
+        # Snapshot yazılırken gelen yeni op'lar yeni journal dosyasına düşer
+        if self.journal:
+            self.journal.rotate()
+        return upserts, deletes
+
+    def _restore_pending(self, upserts: List[Tuple[int, dict]], deletes: List[str], error: Exception):
+        # Yazılamayanları tekrar kirli işaretle, bir sonraki flush'ta denensin
+        print(f"⚠️ Veritabanı yazımı başarısız: {error}")
+        for _, record in upserts:
+            if record["id"] in self.by_id:
+                self._dirty.setdefault(record["id"], None)
+        for img_id in deletes:
+            self._removed.setdefault(img_id, None)
+
+    def _apply(self, upserts: List[Tuple[int, dict]], deletes: List[str], revision: int):
+        with span("store_flush"):
+            self.repo.apply(upserts, deletes, revision)
+
+    def flush(self) -> bool:
+        # False: yazım başarısız, değişiklikler hâlâ journal'da bekliyor
+        if not self._dirty and not self._removed:
+            return True
+        upserts, deletes = self._take_pending()
+        try:
+            self._apply(upserts, deletes, self.revision)
+        except Exception as e:
+            self._restore_pending(upserts, deletes, e)
+            return False
+        if self.journal:
+            self.journal.discard_rotated()
+        return True
+
+    async def flush_async(self):
+        # flush() ile aynı; SQLite yazımı (serialize + commit) I/O havuzunda
+        if self._flushing or (not self._dirty and not self._removed):
+            return
+        self._flushing = True
+        try:
+            upserts, deletes = self._take_pending()
+            try:
+                await self.executor.run(self._apply, upserts, deletes, self.revision)
+            except Exception as e:
+                self._restore_pending(upserts, deletes, e)
+                return
+            if self.journal:
+                self.journal.discard_rotated()
+        finally:
+            self._flushing = False
+
+    async def close(self):
+        task = self._flush_task
+        if task and not task.done():
+            if self._flushing:
+                # Yarım kalmış yazımı kesme, bitmesini bekle
+                await asyncio.gather(task, return_exceptions=True)
+            else:
+                task.cancel()
+        self.flush()
+        if self.journal:
+            self.journal.close()
+
+
+# =====================
+# LEGACY JSON IMPORT
+# =====================
+def import_legacy_json(repo: ImageRepository, images_file: str, categories_file: str) -> bool:
+    # Eski images.json / categories.json verisini yalnızca bir kez içeri al
+    if repo.get_meta("legacy_imported"):
+        return False
+
+    images = []
+    if os.path.exists(images_file):
+        try:
+            with open(images_file, "r", encoding="utf-8") as f:
+                images = json.load(f)
+        except json.JSONDecodeError:
+            # Bozuk dosyayı sessizce boş saymak yerine aktarımı durdur
+            raise RuntimeError(f"{images_file} okunamadı, aktarım iptal edildi")
+
+    categories = []
+    if os.path.exists(categories_file):
+        try:
+            with open(categories_file, "r", encoding="utf-8") as f:
+                categories = json.load(f).get("categories", [])
+        except json.JSONDecodeError:
+            categories = []
+
+    if repo.count() == 0 and images:
+        seen = set()
+        unique = []
+        for img in images:
+            if img.get("id") and img["id"] not in seen:
+                seen.add(img["id"])
+                unique.append(img)
+        repo.insert_many(unique)
+
+    if not repo.list_categories() and categories:
+        repo.replace_categories(categories)
+
+    repo.set_meta("legacy_imported", "1")
+    print(f"📦 JSON arşivi SQLite'a aktarıldı: {len(images)} görsel, {len(categories)} kategori")
+    return True
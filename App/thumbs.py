@@ -0,0 +1,89 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, List, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+
+# =====================
+# THUMBNAILS
+# =====================
+THUMB_SIZES = (256, 512)
+
+
+def render_thumbnail(src_path: str, dst_path: str, size: int) -> str:
+    # Worker process içinde çalışır: en uzun kenar "size" olacak şekilde WebP üret
+    with Image.open(src_path) as im:
+        im = ImageOps.exif_transpose(im)
+        im.thumbnail((size, size), Image.LANCZOS)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if "transparency" in im.info or im.mode in ("LA", "P") else "RGB")
+        tmp = dst_path + ".tmp"
+        im.save(tmp, "WEBP", quality=80, method=4)
+    os.replace(tmp, dst_path)
+    return dst_path
+
+
+def pick_size(width: Optional[int]) -> int:
+    # İstenen genişliği karşılayan en küçük hazır boyut
+    for size in THUMB_SIZES:
+        if width is None or width <= size:
+            return size
+    return THUMB_SIZES[-1]
+
+
+class ThumbnailService:
+    def __init__(self, root: str, workers: Optional[int] = None):
+        self.root = root
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: Dict[Tuple[str, int], asyncio.Future] = {}
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def path_for(self, img_id: str, size: int) -> str:
+        return os.path.join(self.root, f"{img_id}_{size}.webp")
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def get(self, img_id: str, src_path: str, size: int) -> str:
+        dst = self.path_for(img_id, size)
+        # Kaynak dosya küçük resimden yeniyse yeniden üret
+        if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src_path):
+            return dst
+
+        key = (img_id, size)
+        pending = self._pending.get(key)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = loop.run_in_executor(self._pool(), render_thumbnail, src_path, dst, size)
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+
+    def remove(self, img_id: str):
+        for size in THUMB_SIZES:
+            try:
+                os.remove(self.path_for(img_id, size))
+            except OSError:
+                pass
+
+    def remove_many(self, img_ids: List[str]):
+        # Bloklayan dosya silme: çağıran I/O havuzunda çalıştırır
+        for img_id in img_ids:
+            self.remove(img_id)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,214 @@
+import os
+import time
+import asyncio
+import urllib.parse
+from collections import deque
+from typing import Optional, List, Tuple
+
+from iopool import IOExecutor
+
+try:
+    # Varsa işletim sisteminin bildirimleri (inotify / ReadDirectoryChangesW)
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+# =====================
+# DOWNLOADS WATCHER
+# =====================
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+class DownloadEntry:
+    def __init__(self, path: str, size: int, mtime: float):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = size
+        self.mtime = mtime
+
+
+def expected_filename(url: str) -> str:
+    # Tarayıcı dosyayı genelde URL yolundaki son parçayla kaydeder
+    return os.path.basename(urllib.parse.urlsplit(url).path)
+
+
+def _stem(name: str) -> str:
+    # "foo (1).jpg" / "foo(2).jpg" -> "foo"
+    stem = os.path.splitext(name)[0].strip().lower()
+    if stem.endswith(")") and "(" in stem:
+        head, _, num = stem[:-1].rpartition("(")
+        if num.isdigit():
+            stem = head.strip()
+    return stem
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "DownloadWatcher"):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+    def on_moved(self, event):
+        # Firefox ".part" dosyasını bitince asıl adına taşır
+        if not event.is_directory:
+            self.watcher.notify(event.dest_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notify(event.src_path)
+
+
+class DownloadWatcher:
+    def __init__(self, path: str, executor: IOExecutor, capacity: int = 64, poll_interval: float = 2.0,
+                 window: float = 300):
+        self.path = path
+        # Tarama / stat event loop dışında, paylaşılan I/O havuzunda
+        self.io = executor.run
+        self.poll_interval = poll_interval
+        self.window = window
+        # Son indirilen görseller için küçük halka tampon
+        self.recent: deque = deque(maxlen=capacity)
+        self.mode = None
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._observer = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._dir_mtime = 0.0
+        self._last_scan = 0.0
+
+    @property
+    def available(self) -> bool:
+        return os.path.isdir(self.path)
+
+    # ---------- yaşam döngüsü ----------
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if not self.available:
+            print(f"⚠️ İndirme klasörü bulunamadı: {self.path}")
+            return
+
+        # Açılıştan hemen önce inmiş dosyaları da yakala
+        await self._scan(since=time.time() - self.window)
+
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.path, recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+            self.mode = "events"
+        else:
+            self._poll_task = asyncio.create_task(self._poll())
+            self.mode = "polling"
+        print(f"👀 İndirme klasörü izleniyor ({self.mode}): {self.path}")
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    # ---------- kayıt ----------
+    def notify(self, path: str):
+        # Observer kendi thread'inde çalışır: stat orada, kayıt event loop'ta
+        if self._loop is None or not path.lower().endswith(IMAGE_EXTENSIONS):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        self._loop.call_soon_threadsafe(self.record, path, st.st_size, st.st_mtime)
+
+    def record(self, path: str, size: int, mtime: float):
+        # Aynı dosya tekrar bildirildiyse (modified) eski kaydı güncelle
+        for entry in self.recent:
+            if entry.path == path:
+                self.recent.remove(entry)
+                break
+        self.recent.append(DownloadEntry(path, size, mtime))
+        self._changed.set()
+
+    def forget(self, path: str):
+        for entry in self.recent:
+            if entry.path == path:
+                self.recent.remove(entry)
+                return
+
+    # ---------- polling fallback ----------
+    def _list_recent(self, since: float) -> List[Tuple[str, int, float]]:
+        # I/O havuzunda çalışır
+        found = []
+        with os.scandir(self.path) as it:
+            for item in it:
+                if not item.name.lower().endswith(IMAGE_EXTENSIONS) or not item.is_file():
+                    continue
+                st = item.stat()
+                if st.st_mtime >= since:
+                    found.append((item.path, st.st_size, st.st_mtime))
+        return sorted(found, key=lambda f: f[2])
+
+    async def _scan(self, since: float):
+        started = time.time()
+        try:
+            found = await self.io(self._list_recent, since)
+        except OSError as e:
+            print(f"⚠️ İndirme klasörü taranamadı: {e}")
+            found = []
+        for path, size, mtime in found:
+            self.record(path, size, mtime)
+        self._last_scan = started
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                dir_mtime = (await self.io(os.stat, self.path)).st_mtime
+            except OSError:
+                continue
+            # Klasöre dosya eklenmedikçe / ad değişmedikçe taramaya gerek yok
+            if dir_mtime != self._dir_mtime:
+                self._dir_mtime = dir_mtime
+                await self._scan(since=self._last_scan - self.poll_interval)
+
+    # ---------- eşleştirme ----------
+    def match(self, url: Optional[str] = None, size: Optional[int] = None,
+              max_age: float = 60) -> Tuple[int, Optional[DownloadEntry]]:
+        now = time.time()
+        wanted = _stem(expected_filename(url)) if url else ""
+        best: Tuple[int, float, Optional[DownloadEntry]] = (-1, 0.0, None)
+
+        for entry in self.recent:
+            if now - entry.mtime > max_age or not os.path.isfile(entry.path):
+                continue
+            # Puan: dosya adı eşleşmesi > boyut eşleşmesi > en yeni dosya
+            score = 0
+            if wanted and _stem(entry.name) == wanted:
+                score += 2
+            if size is not None and entry.size == size:
+                score += 1
+            if (score, entry.mtime) > best[:2]:
+                best = (score, entry.mtime, entry)
+        return best[0], best[2]
+
+    async def wait_for(self, url: Optional[str] = None, size: Optional[int] = None,
+                       max_age: float = 60, timeout: float = 2) -> Optional[DownloadEntry]:
+        # Adı/boyutu tutan bir dosya yoksa indirme henüz bitmemiş olabilir:
+        # kısa bir süre bekle, sonra en yeni dosyaya düş
+        deadline = time.monotonic() + timeout
+        while True:
+            score, entry = self.match(url, size, max_age)
+            remaining = deadline - time.monotonic()
+            if score > 0 or remaining <= 0:
+                return entry
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass